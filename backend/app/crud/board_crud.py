@@ -0,0 +1,127 @@
+import asyncio
+import random
+from collections import deque
+from typing import List, Optional
+from cachetools import TTLCache
+from sqlalchemy import bindparam, func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from models import Board
+
+
+# Hot board queries, built once at import time with bound parameters
+# (per request only the parameter values change; SQLAlchemy reuses the cached compiled SQL)
+# Pages select plain columns (no ORM objects), returned as dicts ready for the JSON response
+_BOARDS_PAGE = (
+    select(*Board.__table__.columns)
+    .where(Board.id > bindparam("after_id"))
+    .order_by(Board.id)
+    .limit(bindparam("limit"))
+)
+_BOARDS_PAGE_BY_DIFFICULTY = _BOARDS_PAGE.where(Board.difficulty == bindparam("difficulty"))
+
+# Random picks sort only board ids (an index-only scan of ix_boards_difficulty_id when filtering by
+# difficulty), then load the puzzle / solution columns of the chosen rows by primary key
+# (correlate(None): the id subquery must run once on its own, not per row of the outer boards query)
+_RANDOM_ID = select(Board.id).order_by(func.random()).limit(1).correlate(None)
+_RANDOM_ID_BY_DIFFICULTY = _RANDOM_ID.where(Board.difficulty == bindparam("difficulty"))
+
+_RANDOM_BOARD = select(Board).where(Board.id == _RANDOM_ID.scalar_subquery())
+_RANDOM_BOARD_BY_DIFFICULTY = select(Board).where(Board.id == _RANDOM_ID_BY_DIFFICULTY.scalar_subquery())
+
+# Random picks fetched in one query for take_random_board (plain rows, safe to share between sessions)
+RANDOM_POOL_SIZE = 32
+_RANDOM_POOL_IDS = select(Board.id).order_by(func.random()).limit(RANDOM_POOL_SIZE).correlate(None)
+_RANDOM_POOL_COLUMNS = select(Board.id, Board.puzzle, Board.solution, Board.difficulty)
+
+_RANDOM_POOL = _RANDOM_POOL_COLUMNS.where(Board.id.in_(_RANDOM_POOL_IDS))
+_RANDOM_POOL_BY_DIFFICULTY = _RANDOM_POOL_COLUMNS.where(
+    Board.id.in_(_RANDOM_POOL_IDS.where(Board.difficulty == bindparam("difficulty")))
+)
+
+_COUNT_BY_DIFFICULTY = select(func.count(Board.id)).where(Board.difficulty == bindparam("difficulty"))
+
+
+# Numeric columns come back as Decimal, which orjson can't encode; sent as strings like BoardResponse does
+_DECIMAL_COLUMNS = ("completion_rate", "average_completion_time")
+
+
+def _board_row_to_dict(row) -> dict:
+    board = dict(row)
+    for column in _DECIMAL_COLUMNS:
+        if board[column] is not None:
+            board[column] = str(board[column])
+    return board
+
+
+async def get_boards(db: AsyncSession, difficulty: Optional[str] = None, after_id: int = 0, limit: int = 50) -> List[dict]:
+    """
+    Keyset pagination: returns up to `limit` boards (optionally of the given difficulty)
+    with an id greater than `after_id`. Pass the last id of a page as `after_id` to fetch the next one.
+
+    Boards are returned as plain dicts in the BoardResponse layout, so the list routes can
+    send them without building ORM objects or validating every row through Pydantic.
+    """
+    if difficulty:
+        result = await db.execute(_BOARDS_PAGE_BY_DIFFICULTY, {"difficulty": difficulty, "after_id": after_id, "limit": limit})
+    else:
+        result = await db.execute(_BOARDS_PAGE, {"after_id": after_id, "limit": limit})
+
+    return [_board_row_to_dict(row) for row in result.mappings()]
+
+
+async def get_random_board(db: AsyncSession, difficulty: Optional[str] = None) -> Optional[Board]:
+    """
+    Returns a random board (optionally of the given difficulty), or None if there are none.
+
+    The pick happens in the database (ORDER BY random() LIMIT 1 over the ids only), so only one row is loaded.
+    """
+    if difficulty:
+        return (await db.scalars(_RANDOM_BOARD_BY_DIFFICULTY, {"difficulty": difficulty})).first()
+
+    return (await db.scalars(_RANDOM_BOARD)).first()
+
+
+# Pools of random boards per difficulty (None = any difficulty), each refilled under its own lock
+# (fixed set of keys, so arbitrary difficulty strings from clients can't grow it)
+_random_pools = {difficulty: (deque(), asyncio.Lock()) for difficulty in (None, "easy", "medium", "hard", "expert")}
+
+
+async def take_random_board(db: AsyncSession, difficulty: Optional[str] = None):
+    """
+    Returns a random board row (id, puzzle, solution, difficulty), or None if there are none.
+
+    Boards are handed out from a pool filled with RANDOM_POOL_SIZE random picks in a single query,
+    so concurrent new-game requests share one database fetch instead of each running
+    ORDER BY random(). Callers that arrive during a refill wait for it and take from the same pool.
+    Unknown difficulties fall back to get_random_board.
+    """
+    if difficulty not in _random_pools:
+        return await get_random_board(db, difficulty)
+
+    pool, lock = _random_pools[difficulty]
+    async with lock:
+        if not pool:
+            if difficulty:
+                rows = (await db.execute(_RANDOM_POOL_BY_DIFFICULTY, {"difficulty": difficulty})).all()
+            else:
+                rows = (await db.execute(_RANDOM_POOL)).all()
+            random.shuffle(rows)  # Only the id subquery is randomly ordered; the rows come back in table order
+            pool.extend(rows)
+
+        return pool.popleft() if pool else None
+
+
+# Board counts per difficulty, cached for a minute (boards are only added by populate_boards,
+# which runs in its own process, so a short TTL bounds how stale a count can be)
+_count_cache = TTLCache(maxsize=8, ttl=60)
+
+
+async def count_boards(db: AsyncSession, difficulty: str) -> int:
+    """
+    Returns the number of boards with the given difficulty (cached per difficulty).
+    """
+    count = _count_cache.get(difficulty)
+    if count is None:
+        count = _count_cache[difficulty] = await db.scalar(_COUNT_BY_DIFFICULTY, {"difficulty": difficulty})
+
+    return count
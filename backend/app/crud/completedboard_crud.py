@@ -1,6 +1,9 @@
+from sqlalchemy import select
 from sqlalchemy.orm import Session
-from models import CompletedBoard
+from models import Board, CompletedBoard, GameSession
 from schemas import CompletedBoardCreate
+from utils import db_transaction
+from crud import user_crud, gamesession_crud
 
 
 
@@ -17,3 +20,38 @@ def create_completed_board(db: Session, completed_board_data: CompletedBoardCrea
     db.refresh(completed_board)
     
     return completed_board
+
+
+def complete_game_session(db: Session, game_session: GameSession) -> CompletedBoard:
+    """
+    Completes a game session in one transaction:
+    - Records the CompletedBoard entry
+    - Updates the user's stored stats (see user_crud.record_completed_board)
+    - Deletes the game session
+    """
+    with db_transaction(db):
+        completed_board = CompletedBoard(
+            user_id=game_session.user_id,
+            board_id=game_session.board_id,
+            score=game_session.current_score or 0,
+            total_time_spent=game_session.elapsed_time or 0,
+            hints_used=game_session.hints_used or 0,
+            mistakes_made=game_session.mistakes_made or 0,
+        )
+        db.add(completed_board)
+
+        difficulty = db.scalar(select(Board.difficulty).where(Board.id == game_session.board_id))
+        user_crud.record_completed_board(
+            db,
+            game_session.user_id,
+            difficulty,
+            completed_board.total_time_spent,
+            completed_board.score,
+        )
+
+        db.delete(game_session)
+        db.flush()  # INSERT ... RETURNING fills in id and completed_at
+
+    gamesession_crud.forget_active_session(game_session.user_id)
+
+    return completed_board
@@ -1,10 +1,76 @@
-from datetime import datetime, timezone
-import json
+import asyncio
+import threading
+from typing import Dict, List, Optional, Tuple
+from cachetools import LRUCache, TTLCache
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import Integer, cast, func, update
 from sqlalchemy.orm import Session
+from database import SessionLocal
 from models import GameSession, Board
 from schemas import GameSessionCreate, GameSessionUpdate
 from fastapi import HTTPException
-from utils import db_transaction
+from utils import db_transaction, BoardStateManager, Masks, digits_to_cells, pack_masks, unpack_masks
+
+
+def _read_masks(session: GameSession) -> Masks:
+    """Unpacks the session's stored row, column and box masks."""
+    return unpack_masks(session.row_mask), unpack_masks(session.col_mask), unpack_masks(session.box_mask)
+
+
+def _write_masks(session: GameSession, masks: Masks):
+    """Packs row, column and box masks back onto the session."""
+    row_masks, col_masks, box_masks = masks
+    session.row_mask = pack_masks(row_masks)
+    session.col_mask = pack_masks(col_masks)
+    session.box_mask = pack_masks(box_masks)
+
+
+# Parsed (puzzle, solution) cells per board_id (boards never change once inserted; 4096 boards is roughly 1 MB)
+_board_cells_cache = LRUCache(maxsize=4096)
+_board_cells_lock = threading.Lock()
+
+
+def _board_cells(db: Session, board_id: int) -> Tuple[bytes, bytes]:
+    """
+    Returns a board's (puzzle, solution) as 81 cell bytes each.
+
+    A cache miss is loaded through the caller's `db`, so no second connection is checked out
+    while the caller's transaction is open. An unknown board raises LookupError, which is not cached.
+    """
+    with _board_cells_lock:
+        cells = _board_cells_cache.get(board_id)
+    if cells is not None:
+        return cells
+
+    board = db.query(Board.puzzle, Board.solution).filter(Board.id == board_id).first()
+    if not board:
+        raise LookupError(f"Board {board_id} not found")
+
+    cells = digits_to_cells(board.puzzle), digits_to_cells(board.solution)
+    with _board_cells_lock:
+        _board_cells_cache[board_id] = cells
+    return cells
+
+
+# Active sessions of users who are making moves, keyed by user_id, so a move doesn't need a SELECT first.
+# Entries are detached snapshots (never modified in place); every write path below refreshes or drops them.
+# Moves only apply if the row is unchanged since the snapshot (see update_cell_and_track_progress),
+# so a stale entry (e.g. one cached by another worker process) can't overwrite newer progress.
+_active_sessions = TTLCache(maxsize=10_000, ttl=5)
+_active_sessions_lock = threading.Lock()
+
+
+def _cache_session(db: Session, session: GameSession):
+    """Detaches the session from the request's db session and caches it as the user's active session."""
+    db.expunge(session)
+    with _active_sessions_lock:
+        _active_sessions[session.user_id] = session
+
+
+def forget_active_session(user_id: int):
+    """Drops the user's cached active session, if any."""
+    with _active_sessions_lock:
+        _active_sessions.pop(user_id, None)
 
 
 def create_game_session(db: Session, game_session: GameSessionCreate):
@@ -12,28 +78,35 @@ def create_game_session(db: Session, game_session: GameSessionCreate):
     Start a new game session for the user.
     Deletes any existing active session for the user before creating the new one.
     """
+    forget_active_session(game_session.user_id)
+
     with db_transaction(db):
 
         # Delete any existing game session for the user
         existing_session = db.query(GameSession).filter(GameSession.user_id == game_session.user_id).first()
         if existing_session:  # need to add functionality to add to uncompleted boards
             db.delete(existing_session)
+            db.flush()  # Emit the DELETE before the INSERT so the unique user_id index isn't violated
 
         # Get the board to start with initial state
-        board = db.query(Board).filter(Board.id == game_session.board_id).first()
-        if not board:
+        try:
+            puzzle, solution = _board_cells(db, game_session.board_id)
+        except LookupError:
             raise HTTPException(status_code=404, detail="Board not found")
 
         # Create the new game session
         new_session = GameSession(
             user_id=game_session.user_id,
             board_id=game_session.board_id,
-            board_progress=board.puzzle,  # Start with the initial state
+            board_progress=puzzle,  # Start with the initial state
+            solution=solution,  # Denormalized so moves and hints don't need the Board row
+            filled_count=BoardStateManager.count_filled(puzzle),
         )
+        _write_masks(new_session, BoardStateManager.build_masks(new_session.board_progress))
 
         # Add new game session to database
         db.add(new_session)
-        db.refresh(new_session)
+        db.flush()  # INSERT ... RETURNING fills in id and the server-side timestamps
 
         return new_session
 
@@ -49,6 +122,22 @@ def get_active_game_session(db: Session, user_id: int):
     return game_session
 
 
+def get_active_game_session_cached(db: Session, user_id: int) -> Optional[GameSession]:
+    """
+    Same as get_active_game_session, answered from the active session cache when possible.
+    The returned session is detached and read-only; only pass it to update_cell_and_track_progress.
+    """
+    with _active_sessions_lock:
+        session = _active_sessions.get(user_id)
+
+    if session is None:
+        session = get_active_game_session(db, user_id)
+        if session:
+            _cache_session(db, session)
+
+    return session
+
+
 def update_game_session(db: Session, session: GameSession, updates: GameSessionUpdate):
     """
     Update fields on an active game session using provided values only.
@@ -56,19 +145,94 @@ def update_game_session(db: Session, session: GameSession, updates: GameSessionU
     # Loop through each field in the schema
     update_data = updates.model_dump(exclude_unset=True)
 
+    # Board progress arrives as an 81-digit string, stored as 81 cell bytes
+    if update_data.get("board_progress") is not None:
+        update_data["board_progress"] = digits_to_cells(update_data["board_progress"])
+        # Keep the masks and filled count in sync with the replaced board
+        _write_masks(session, BoardStateManager.build_masks(update_data["board_progress"]))
+        session.filled_count = BoardStateManager.count_filled(update_data["board_progress"])
+
     for field, value in update_data.items():
         setattr(session, field, value)  # Dynamically update field on the model
 
-    # Manually update the 'last_active_at' timestamp to now
-    session.last_active_at = datetime.now(timezone.utc)
+    # Manually update the 'last_active_at' timestamp to now (database clock, fetched back with RETURNING)
+    session.last_active_at = func.now()
 
     # Commit changes to database
     db.commit()
-    db.refresh(session)
+    forget_active_session(session.user_id)
 
     return session
 
 
+def _write_session_update(user_id: int, updates: GameSessionUpdate) -> GameSession:
+    """Applies `updates` to the user's active session in its own database session (runs in the threadpool)."""
+    with SessionLocal() as db:
+        session = get_active_game_session(db, user_id)
+        if not session:
+            raise HTTPException(status_code=404, detail="No active session found for this user.")
+
+        return update_game_session(db, session, updates)
+
+
+class SessionUpdateBatcher:
+    """
+    Coalesces game session PATCH updates per user.
+
+    Updates for a user that arrive within `interval` seconds of the first one (or until `max_batch`
+    are queued) are merged, later values winning, and written with a single update_game_session call.
+    Every caller in the batch gets the session as of that write (or the same error).
+    """
+
+    def __init__(self, interval: float = 0.2, max_batch: int = 16):
+        self.interval = interval
+        self.max_batch = max_batch
+        self._pending: Dict[int, Tuple[dict, List[asyncio.Future]]] = {}  # user_id -> (merged fields, waiters)
+        self._flushes = set()  # Running flush tasks (referenced so they aren't garbage collected)
+
+    async def submit(self, user_id: int, updates: GameSessionUpdate) -> GameSession:
+        loop = asyncio.get_running_loop()
+        batch = self._pending.get(user_id)
+        if batch is None:
+            batch = self._pending[user_id] = ({}, [])
+            loop.call_later(self.interval, self._start_flush, user_id, batch)
+
+        fields, waiters = batch
+        fields.update(updates.model_dump(exclude_unset=True))
+        future = loop.create_future()
+        waiters.append(future)
+
+        if len(waiters) >= self.max_batch:
+            self._start_flush(user_id, batch)
+
+        return await future
+
+    def _start_flush(self, user_id: int, batch: Tuple[dict, List[asyncio.Future]]):
+        if self._pending.get(user_id) is not batch:
+            return  # Already flushed (batch filled up before the timer fired)
+
+        del self._pending[user_id]
+        task = asyncio.ensure_future(self._flush(user_id, *batch))
+        self._flushes.add(task)
+        task.add_done_callback(self._flushes.discard)
+
+    async def _flush(self, user_id: int, fields: dict, waiters: List[asyncio.Future]):
+        try:
+            session = await run_in_threadpool(_write_session_update, user_id, GameSessionUpdate.model_validate(fields))
+        except Exception as exc:
+            for waiter in waiters:
+                if not waiter.done():  # Skip requests that were cancelled (client disconnected)
+                    waiter.set_exception(exc)
+        else:
+            for waiter in waiters:
+                if not waiter.done():
+                    waiter.set_result(session)
+
+
+# Shared by the PATCH /gamesession/update route
+session_update_batcher = SessionUpdateBatcher()
+
+
 def update_cell_and_track_progress(db: Session, session: GameSession, row: int, col: int, value: int):
     """
     Updates a single cell in the board and performs all related tracking:
@@ -76,73 +240,130 @@ def update_cell_and_track_progress(db: Session, session: GameSession, row: int,
     - Mistakes
     - Completion percentage
     - Last active time
+
+    `session` may be a cached snapshot (see get_active_game_session_cached). If the row changed since
+    the snapshot was taken, the move is re-applied once on the current row. A move the snapshot
+    rejects is re-checked on the current row too (e.g. another worker or the PATCH batcher may have
+    cleared the conflicting cell), so only a rejection by the current row returns 400.
+    """
+    # Out-of-range moves are rejected before the cell is read
+    # (update_cell takes row / col / value without Body limits)
+    if not (0 <= row < 9 and 0 <= col < 9):
+        raise HTTPException(status_code=400, detail="Invalid move: violates Sudoku rules")
+
+    if not _is_valid_move(session, row, col, value):
+        session = _reload_active_session(db, session.user_id)
+
+    updated_session = _apply_cell_update(db, session, row, col, value)
+
+    if updated_session is None:
+        session = _reload_active_session(db, session.user_id)
+        updated_session = _apply_cell_update(db, session, row, col, value)
+        if updated_session is None:
+            raise HTTPException(status_code=409, detail="Game session was updated concurrently, please retry the move")
+
+    # The RETURNING row is the latest state, so the next move can start from it without a SELECT
+    _cache_session(db, updated_session)
+
+    return updated_session
+
+
+def _is_valid_move(session: GameSession, row: int, col: int, value: int) -> bool:
+    """Checks a move (with row / col already in range) against the session's board."""
+    current = session.board_progress[row * 9 + col]
+    return BoardStateManager.validate_move(_read_masks(session), row, col, value, current)
+
+
+def _reload_active_session(db: Session, user_id: int) -> GameSession:
+    """Drops the user's cached session and reads the current row."""
+    forget_active_session(user_id)
+    session = get_active_game_session(db, user_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="No active session found")
+    return session
+
+
+def _apply_cell_update(db: Session, session: GameSession, row: int, col: int, value: int) -> Optional[GameSession]:
+    """
+    Applies a move computed from `session` in a single UPDATE ... RETURNING.
+    Returns None (nothing written) if the row's last_active_at no longer matches `session`.
     """
     with db_transaction(db):
 
-        # Get current board state and solution
-        current_board = json.loads(session.board_progress)
-        board = db.query(Board).filter(Board.id == session.board_id).first()
-        solution = json.loads(board.solution)
+        # Get current board state and solution (stored on the session itself)
+        current_board = bytearray(session.board_progress)
+        solution = session.solution
+        masks = _read_masks(session)
+        cell = row * 9 + col
+        current = current_board[cell]
 
         # Validate move
-        if not BoardStateManager.validate_move(current_board, row, col, value):
+        if not BoardStateManager.validate_move(masks, row, col, value, current):
             raise HTTPException(
                 status_code=400, 
                 detail="Invalid move: violates Sudoku rules"
             )
 
-        # Time tracking
-        now = datetime.now(timezone.utc)
-        delta = (now - session.last_active_at).total_seconds()
-        session.elapsed_time += int(delta)
-        session.last_active_at = now
+        # Update cell and track mistakes (a wrong value counts as one mistake)
+        is_mistake = value != solution[cell]
+        filled_count = session.filled_count + (value != 0) - (current != 0)  # Only this cell changed
+        completion = BoardStateManager.calculate_completion(filled_count)
+        current_board[cell] = value
+        BoardStateManager.apply_move(masks, row, col, value, current)
+        row_masks, col_masks, box_masks = masks
+
+        # Time tracking and counters are computed by the database in the same UPDATE
+        # (NOW() - last_active_at), so two rapid moves can't lose each other's increments
+        elapsed_time = GameSession.elapsed_time + cast(func.extract("epoch", func.now() - GameSession.last_active_at), Integer)
+        mistakes_made = GameSession.mistakes_made + int(is_mistake)
+
+        stmt = (
+            update(GameSession)
+            .where(GameSession.id == session.id)
+            .where(GameSession.last_active_at == session.last_active_at)  # Unchanged since `session` was read
+            .values(
+                board_progress=bytes(current_board),
+                row_mask=pack_masks(row_masks),
+                col_mask=pack_masks(col_masks),
+                box_mask=pack_masks(box_masks),
+                filled_count=filled_count,
+                completion_percentage=completion,
+                mistakes_made=mistakes_made,
+                elapsed_time=elapsed_time,
+                last_active_at=func.now(),
+                current_score=BoardStateManager.score_expression(
+                    elapsed_time,
+                    mistakes_made,
+                    GameSession.hints_used,
+                    completion
+                ),
+            )
+            .returning(GameSession)
+        )
 
-        # Mistake detection
-        if value != solution[row][col]:
-            session.mistakes_made += 1
+        # RETURNING refreshes the loaded session object with the new row (no extra SELECT)
+        return db.scalars(
+            stmt, execution_options={"populate_existing": True, "synchronize_session": False}
+        ).one_or_none()
 
-        # Update cell and track mistakes
-        if value != solution[row][col]:
-            session.mistakes_made += 1
-        current_board[row][col] = value
-        session.board_progress = json.dumps(current_board)
+def get_hint(db: Session, session: GameSession) -> dict:
+    """Provides a hint for the current game state"""
+    with db_transaction(db):
+        # Find first empty cell that can be revealed
+        cell = session.board_progress.find(0)
+        if cell == -1:
+            raise HTTPException(status_code=400, detail="No hints available - board is full")
 
-        # Update completion and score
-        session.completion_percentage = BoardStateManager.calculate_completion(current_board)
+        session.hints_used += 1
+        # Update score after using hint
         session.current_score = BoardStateManager.calculate_score(
             session.elapsed_time,
             session.mistakes_made,
             session.hints_used,
             session.completion_percentage
         )
-
-        # Commit updates
-        db.refresh(session)
-
-    return session
-
-def get_hint(db: Session, session: GameSession) -> dict:
-    """Provides a hint for the current game state"""
-    with db_transaction(db):
-        board = db.query(Board).filter(Board.id == session.board_id).first()
-        solution = json.loads(board.solution)
-        current = json.loads(session.board_progress)
-
-        # Find first empty cell that can be revealed
-        for i in range(9):
-            for j in range(9):
-                if current[i][j] == 0:
-                    session.hints_used += 1
-                    # Update score after using hint
-                    session.current_score = BoardStateManager.calculate_score(
-                        session.elapsed_time,
-                        session.mistakes_made,
-                        session.hints_used,
-                        session.completion_percentage
-                    )
-                    return {"row": i, "col": j, "value": solution[i][j]}
-
-        raise HTTPException(status_code=400, detail="No hints available - board is full")
+        forget_active_session(session.user_id)
+        return {"row": cell // 9, "col": cell % 9, "value": session.solution[cell]}
 
 
 def delete_game_session(db: Session, session: GameSession):
@@ -151,13 +372,15 @@ def delete_game_session(db: Session, session: GameSession):
     """
     db.delete(session)
     db.commit()
+    forget_active_session(session.user_id)
 
     
-def get_game_sessions(db: Session):
+def get_game_sessions(db: Session, after_id: int = 0, limit: int = 100):
     """
-    Fetches all game sessions from the database.
+    Fetches a page of game sessions from the database (keyset pagination on id).
+    Pass the last id of a page as `after_id` to fetch the next one.
     """
-    return db.query(GameSession).all()
+    return db.query(GameSession).filter(GameSession.id > after_id).order_by(GameSession.id).limit(limit).all()
     # return db.query(GameSession).order_by(GameSession.started_at.desc()).all()  # to return sorted by most recent session
 
 
@@ -1,12 +1,13 @@
+from sqlalchemy import func, update
 from sqlalchemy.orm import Session
-from passlib.context import CryptContext
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from models import User
 from schemas import UserCreate, UserResponse, UserStatsResponse, UserUpdate
-import random
+import secrets
 import string
-from typing import Optional
+from typing import List, Optional
 from fastapi import HTTPException
-from security import verify_password, create_access_token
+from security import hash_password, create_access_token, forget_cached_user
 from utils import db_transaction
 
 
@@ -14,8 +15,43 @@ from utils import db_transaction
 # USER 
 # =========================
 
-# Password hashing setup
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Characters used for the random part of guest usernames
+_GUEST_ALPHABET = string.ascii_letters + string.digits
+
+# Attempts at picking a free guest username before giving up
+_GUEST_USERNAME_ATTEMPTS = 5
+
+def _guest_username() -> str:
+    """Returns a random guest username, e.g. Guest_a8Kq2Z (62^6 possible names)."""
+    return "Guest_" + "".join(secrets.choice(_GUEST_ALPHABET) for _ in range(6))
+
+def _username_taken(db: Session, username: str) -> bool:
+    return db.query(User.id).filter(func.lower(User.username) == username.lower()).first() is not None
+
+def _email_taken(db: Session, email: str) -> bool:
+    return db.query(User.id).filter(func.lower(User.email) == email.lower()).first() is not None
+
+# Inserts a User in a single round trip, relying on the unique constraints
+def _insert_user(db: Session, user_data: UserCreate, hashed_password: Optional[str]) -> Optional[User]:
+    """
+    Inserts a new user with INSERT ... ON CONFLICT DO NOTHING RETURNING.
+
+    Returns None instead of raising when a unique username / email is already taken
+    (no conflict target, so the case-insensitive lower(...) indexes are covered too).
+    """
+    stmt = (
+        pg_insert(User)
+        .values(
+            username=user_data.username,
+            email=user_data.email,
+            password_hash=hashed_password,
+            is_guest=user_data.is_guest
+        )
+        .on_conflict_do_nothing()
+        .returning(User)
+    )
+
+    return db.scalars(stmt).first()
 
 # Creates a new User
 def create_user(db: Session, user_data: UserCreate) -> UserResponse:
@@ -33,126 +69,174 @@ def create_user(db: Session, user_data: UserCreate) -> UserResponse:
     Returns:
         UserResponse: The newly created user.
     """
+    # Hash password if provided
+    hashed_password = None
+    if user_data.password:
+        hashed_password = hash_password(user_data.password)
+
     with db_transaction(db):
 
         # Generate a guest username if no username is provided
         if user_data.is_guest:
-            while True:
-                random_username = "Guest_" + "".join(random.choices(string.ascii_letters + string.digits, k=6))
-                existing_user = db.query(User).filter(User.username == random_username).first()
-                if not existing_user:
-                    user_data.username = random_username
+            if user_data.email and _email_taken(db, user_data.email):
+                raise HTTPException(status_code=400, detail="Email already taken.")
+
+            new_user = None
+            for _ in range(_GUEST_USERNAME_ATTEMPTS):
+                user_data.username = _guest_username()
+                new_user = _insert_user(db, user_data, hashed_password)
+                if new_user is not None:
                     break
+
+                # Retry only on the (rare) random name collision
+                if not _username_taken(db, user_data.username):
+                    raise HTTPException(status_code=400, detail="Email already taken.")
+
+            if new_user is None:
+                raise HTTPException(status_code=500, detail="Could not generate a guest username.")
         else:
-            # Check if username already exists
-            existing_username = db.query(User).filter(User.username == user_data.username).first()
-            if existing_username:
-                raise HTTPException(status_code=400, detail="Username already taken.")
-            
-            # Check if email already exists
-            existing_email = db.query(User).filter(User.email == user_data.email).first()
-            print(existing_email)
-            if existing_email and existing_email != None:
-                raise HTTPException(status_code=400, detail="Email already taken.")
-        
-        # Hash password if provided
-        hashed_password = None
-        if user_data.password:
-            hashed_password = pwd_context.hash(user_data.password)
+            new_user = _insert_user(db, user_data, hashed_password)
 
-        # Create new user object
-        new_user = User(
-            username=user_data.username,
-            email=user_data.email,
-            password_hash=hashed_password,
-            is_guest=user_data.is_guest
-        )
+            # Nothing inserted: look up which unique field is already taken
+            if new_user is None:
+                if _username_taken(db, user_data.username):
+                    raise HTTPException(status_code=400, detail="Username already taken.")
+                raise HTTPException(status_code=400, detail="Email already taken.")
 
-        # Add user to the database
-        db.add(new_user)
-        db.refresh(new_user)
+        # Create JWT payload: "sub" (subject) must be a string per RFC 7519; email/created_at stay in the DB
+        access_token = create_access_token(data={"sub": str(new_user.id), "usr": new_user.username})
 
-    # Create JWT payload (you can include more fields if needed)
-    access_token = create_access_token(data={"sub": {new_user.id, new_user.username, new_user.email, new_user.created_at}})  # "sub" = subject
+        # Build the response from the RETURNING row before commit expires it
+        user_response = UserResponse(
+            id=new_user.id,
+            username=new_user.username,
+            is_guest=new_user.is_guest,
+            created_at=new_user.created_at
+        )
 
-    return UserResponse(
-        id=new_user.id,
-        username=new_user.username,
-        is_guest=new_user.is_guest,
-        created_at=new_user.created_at
-    )
+    return user_response
 
-# Fetches all Users from the database
-def get_users(db: Session):
-    return db.query(User).all()
+# Fetches a page of Users from the database
+def get_users(db: Session, after_id: int = 0, limit: int = 100) -> List[User]:
     """
-    # Fetching all Users but with pagination
-    # def get_users(db: Session, skip: int = 0, limit: int = 10):
-        # return db.query(User).offset(skip).limit(limit).all()
+    Keyset pagination: returns up to `limit` users with an id greater than `after_id`.
+    Pass the last id of a page as `after_id` to fetch the next one.
     """
+    return db.query(User).filter(User.id > after_id).order_by(User.id).limit(limit).all()
 
 # Fetches User based on their id
 def get_user_by_id(db: Session, user_id: int):
-    return db.query(User).filter(User.id == user_id).first()
+    return db.get(User, user_id)
 
-# Fetches User based on their Username
+# Fetches User based on their Username (case insensitive, served by ix_users_username_lower)
 def get_user_by_username(db: Session, username: str):
-    # return db.query(User).filter(User.username == username).first()
-    return db.query(User).filter(User.username.ilike(username)).first()
-    """
-    Can add support to be case insensitive
-
-    PostgreSQL has a ILIKE operator for case-insensitive matching:
-    return db.query(User).filter(User.username.ilike(username)).first()
-
-    If you're using a database that doesn't support ILIKE, you can force lowercase:
     return db.query(User).filter(func.lower(User.username) == username.lower()).first()
-    """
+
+# Columns selected for UserStatsResponse (a projection, so the full User row is never loaded)
+USER_STATS_COLUMNS = (
+    User.completed_boards_count,
+    User.incomplete_boards_count,
+    User.weekly_completed_boards_count,
+    User.completed_boards_easy,
+    User.completed_boards_medium,
+    User.completed_boards_hard,
+    User.completed_boards_expert,
+
+    User.total_games_played_easy,
+    User.total_games_played_medium,
+    User.total_games_played_hard,
+    User.total_games_played_expert,
+
+    User.win_rate_easy,
+    User.win_rate_medium,
+    User.win_rate_hard,
+    User.win_rate_expert,
+
+    User.completion_percentage_easy,
+    User.completion_percentage_medium,
+    User.completion_percentage_hard,
+    User.completion_percentage_expert,
+
+    User.fastest_completion_time_easy,
+    User.fastest_completion_time_medium,
+    User.fastest_completion_time_hard,
+    User.fastest_completion_time_expert,
+
+    User.average_completion_time_easy,
+    User.average_completion_time_medium,
+    User.average_completion_time_hard,
+    User.average_completion_time_expert,
+
+    User.streak_count,
+)
+
+# Interval columns are returned as strings
+USER_STATS_INTERVAL_FIELDS = tuple(
+    column.key for column in USER_STATS_COLUMNS
+    if column.key.startswith(("fastest_completion_time_", "average_completion_time_"))
+)
+
+def _interval_to_str(value) -> Optional[str]:
+    return str(value) if value else None
 
 # Gets the stats of a user
 def get_user_stats(db: Session, user_id: int) -> Optional[UserStatsResponse]:
     """Retrieve the statistics for a given user."""
-    user = db.query(User).filter(User.id == user_id).first()
+    row = db.query(*USER_STATS_COLUMNS).filter(User.id == user_id).first()
 
-    if not user:
+    if not row:
         return None  # The route will handle this case
     
-    return UserStatsResponse(
-        completed_boards_count=user.completed_boards_count,
-        incomplete_boards_count=user.incomplete_boards_count,
-        weekly_completed_boards_count=user.weekly_completed_boards_count,
-        completed_boards_easy=user.completed_boards_easy,
-        completed_boards_medium=user.completed_boards_medium,
-        completed_boards_hard=user.completed_boards_hard,
-        completed_boards_expert=user.completed_boards_expert,
-        
-        total_games_played_easy=user.total_games_played_easy,
-        total_games_played_medium=user.total_games_played_medium,
-        total_games_played_hard=user.total_games_played_hard,
-        total_games_played_expert=user.total_games_played_expert,
-
-        win_rate_easy=user.win_rate_easy,
-        win_rate_medium=user.win_rate_medium,
-        win_rate_hard=user.win_rate_hard,
-        win_rate_expert=user.win_rate_expert,
-
-        completion_percentage_easy=user.completion_percentage_easy,
-        completion_percentage_medium=user.completion_percentage_medium,
-        completion_percentage_hard=user.completion_percentage_hard,
-        completion_percentage_expert=user.completion_percentage_expert,
-
-        fastest_completion_time_easy=str(user.fastest_completion_time_easy) if user.fastest_completion_time_easy else None,
-        fastest_completion_time_medium=str(user.fastest_completion_time_medium) if user.fastest_completion_time_medium else None,
-        fastest_completion_time_hard=str(user.fastest_completion_time_hard) if user.fastest_completion_time_hard else None,
-        fastest_completion_time_expert=str(user.fastest_completion_time_expert) if user.fastest_completion_time_expert else None,
-
-        average_completion_time_easy=str(user.average_completion_time_easy) if user.average_completion_time_easy else None,
-        average_completion_time_medium=str(user.average_completion_time_medium) if user.average_completion_time_medium else None,
-        average_completion_time_hard=str(user.average_completion_time_hard) if user.average_completion_time_hard else None,
-        average_completion_time_expert=str(user.average_completion_time_expert) if user.average_completion_time_expert else None,
-
-        streak_count=user.streak_count
-    )
+    stats = row._asdict()
+    for field in USER_STATS_INTERVAL_FIELDS:
+        stats[field] = _interval_to_str(stats[field])
+
+    # Values come straight from the database, so skip per-field validation
+    return UserStatsResponse.model_construct(**stats)
+
+# Difficulties with their own stat columns on User (completed_boards_<difficulty>, win_rate_<difficulty>, ...)
+STAT_DIFFICULTIES = ("easy", "medium", "hard", "expert")
+
+# Updates the stored stats of a user for a newly completed board
+def record_completed_board(db: Session, user_id: int, difficulty: str, total_time_spent: int, score: int):
+    """
+    Updates the user's stat counters for a completed board in a single UPDATE (no commit;
+    call it in the same transaction as the CompletedBoard insert so the two never disagree).
+
+    Stats are maintained incrementally here, so get_user_stats stays a single-row read.
+    Every right-hand side sees the row's values from before the update.
+    total_games_played_<difficulty> and win_rate_<difficulty> are left alone: games are
+    not counted when they start, so a completion alone can't tell how many were played.
+
+    Args:
+        db (Session): The database session.
+        user_id (int): The user who completed the board.
+        difficulty (str): The board's difficulty.
+        total_time_spent (int): Time taken, in seconds.
+        score (int): The final score.
+    """
+    completed_count = func.coalesce(User.completed_boards_count, 0)
+    values = {
+        "completed_boards_count": completed_count + 1,
+        "high_score": func.greatest(User.high_score, score),
+    }
+
+    if difficulty in STAT_DIFFICULTIES:
+        completed = func.coalesce(getattr(User, f"completed_boards_{difficulty}"), 0)
+        fastest = getattr(User, f"fastest_completion_time_{difficulty}")
+        average = getattr(User, f"average_completion_time_{difficulty}")
+        time_spent = func.make_interval(0, 0, 0, 0, 0, 0, total_time_spent)
+
+        values.update({
+            f"completed_boards_{difficulty}": completed + 1,
+            f"fastest_completion_time_{difficulty}": func.least(fastest, time_spent),  # LEAST ignores NULL
+            # Running mean over the completed boards of this difficulty
+            f"average_completion_time_{difficulty}": (
+                (func.coalesce(average, time_spent) * completed + time_spent) / (completed + 1)
+            ),
+        })
+
+    db.execute(update(User).where(User.id == user_id).values(**values))
 
 # Updates user details based on provided user data
 def update_user(db: Session, user_id: int, user_update: UserUpdate) -> Optional[UserResponse]:
@@ -170,7 +254,10 @@ def update_user(db: Session, user_id: int, user_update: UserUpdate) -> Optional[
     Returns:
         UserResponse: The updated user.
     """
-    user = db.query(User).filter(User.id == user_id).first()
+    # Hash the new password up front so no database connection is held during bcrypt
+    hashed_password = hash_password(user_update.password) if user_update.password else None
+
+    user = db.get(User, user_id)
     print(user_update)
 
     if not user:
@@ -182,12 +269,12 @@ def update_user(db: Session, user_id: int, user_update: UserUpdate) -> Optional[
             raise HTTPException(status_code=400, detail="Guests must provide email and password to update.")
 
         # Check if username already exists
-        existing_username = db.query(User).filter(User.username == user_update.username).first()
+        existing_username = db.query(User).filter(func.lower(User.username) == user_update.username.lower()).first() if user_update.username else None
         if existing_username and existing_username.id != user_id:
             raise HTTPException(status_code=400, detail="Username already taken.")
         
         # Check if email already exists
-        existing_email = db.query(User).filter(User.email == user_update.email).first()
+        existing_email = db.query(User).filter(func.lower(User.email) == user_update.email.lower()).first()
         if existing_email and existing_email.id != user_id:
             raise HTTPException(status_code=400, detail="Email already taken.")
         
@@ -195,7 +282,7 @@ def update_user(db: Session, user_id: int, user_update: UserUpdate) -> Optional[
         if user_update.username:
             user.username = user_update.username
         user.email = user_update.email
-        user.password_hash = pwd_context.hash(user_update.password)
+        user.password_hash = hashed_password
         user.is_guest = False
         
     else:
@@ -206,12 +293,13 @@ def update_user(db: Session, user_id: int, user_update: UserUpdate) -> Optional[
         # Allow username and password updates if provided
         if user_update.username:
             user.username = user_update.username
-        if user_update.password:
-            user.password_hash = pwd_context.hash(user_update.password)
+        if hashed_password:
+            user.password_hash = hashed_password
 
     # Commit the changes to the database
     db.commit()
     db.refresh(user)
+    forget_cached_user(user_id)
 
     return UserResponse(
         id=user.id,
@@ -233,12 +321,13 @@ def delete_user(db: Session, user_id: int) -> bool:
     Returns:
         bool: True if deleted, False if user not found.
     """
-    user = db.query(User).filter(User.id == user_id).first()
+    user = db.get(User, user_id)
     if not user:
         return False
 
     db.delete(user)
     db.commit()
+    forget_cached_user(user_id)
     return True
 
 
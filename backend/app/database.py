@@ -1,4 +1,5 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
@@ -16,23 +17,74 @@ DB_NAME = os.getenv("DB_NAME")
 
 # PostgreSQL Database URL
 DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASSWORD}@{DB_HOST}/{DB_NAME}"
+# Same database through the asyncpg driver, for the async routes
+ASYNC_DATABASE_URL = f"postgresql+asyncpg://{DB_USER}:{DB_PASSWORD}@{DB_HOST}/{DB_NAME}"
+
+
+# Connection pool sizes, per worker process. Each worker can open up to
+# DB_POOL_SIZE + DB_MAX_OVERFLOW + DB_ASYNC_POOL_SIZE + DB_ASYNC_MAX_OVERFLOW connections (30 by default),
+# so keep that total times the number of workers below Postgres' max_connections (100 by default)
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "10"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+DB_ASYNC_POOL_SIZE = int(os.getenv("DB_ASYNC_POOL_SIZE", "5"))
+DB_ASYNC_MAX_OVERFLOW = int(os.getenv("DB_ASYNC_MAX_OVERFLOW", "5"))
 
 
 # Establishing Database Connection
 
 # Create an engine to manage the connection
-engine = create_engine(DATABASE_URL)
+engine = create_engine(
+    DATABASE_URL,
+    pool_size=DB_POOL_SIZE,  # Connections kept open in the pool
+    max_overflow=DB_MAX_OVERFLOW,  # Extra connections allowed under burst load
+    pool_pre_ping=True,  # Check a connection is alive before handing it out
+    pool_recycle=1800,  # Replace connections after 30 minutes (before server idle timeouts)
+    pool_use_lifo=True,  # Reuse the most recently returned connection, so idle extras can time out server-side
+    connect_args={"application_name": "sudoku-api"},  # Shows up in pg_stat_activity
+    query_cache_size=1200,  # Compiled SQL cache entries (default 500)
+)
 
 # Create a session factory
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# expire_on_commit=False: objects keep the values just written, so returning them
+# after a commit doesn't trigger a SELECT to reload every column
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, expire_on_commit=False, bind=engine)
+
+# Async engine / sessions (asyncpg) for the `async def` routes (boards, new game), which await
+# the database on the event loop instead of holding a threadpool thread per request
+async_engine = create_async_engine(
+    ASYNC_DATABASE_URL,
+    pool_size=DB_ASYNC_POOL_SIZE,
+    max_overflow=DB_ASYNC_MAX_OVERFLOW,
+    pool_pre_ping=True,
+    pool_recycle=1800,
+    pool_use_lifo=True,
+    connect_args={"server_settings": {"application_name": "sudoku-api"}},
+    query_cache_size=1200,
+)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
 
 # Define a base class for models
 Base = declarative_base()
 
+# Snapshot of a connection pool's usage (exposed by the /health/db-pool endpoint for monitoring)
+# overflow is negative until pool_size connections have been opened
+def pool_stats(pool) -> dict:
+    return {
+        "size": pool.size(),
+        "checked_out": pool.checkedout(),
+        "checked_in": pool.checkedin(),
+        "overflow": pool.overflow(),
+    }
+
 # Dependency function to get database session
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+# Dependency function to get an async database session (for `async def` routes)
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,8 @@
+from slowapi import Limiter
+from slowapi.util import get_remote_address
+
+# Per-client-IP rate limiter for the public, unauthenticated endpoints (login, new game)
+# Limits are applied per route with @limiter.limit(...); the route must take a `request: Request` parameter.
+# Counters live in process memory, so each worker enforces its own limit.
+# Behind a reverse proxy, run uvicorn with --proxy-headers so the client IP (not the proxy's) is used.
+limiter = Limiter(key_func=get_remote_address)
@@ -1,17 +1,28 @@
+import os
 # Import the FastAPI framework to create the API
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 # To allow CORS
 from fastapi.middleware.cors import CORSMiddleware
+# Rate limiting
+from slowapi import _rate_limit_exceeded_handler
+from slowapi.errors import RateLimitExceeded
+from limiter import limiter
 
 # Import the routers (modules that handle different API endpoints)
 # Import database and routers
-from database import Base, engine
+from database import Base, async_engine, engine, pool_stats
 from routers import game, user, auth, board, gamesession
 
 # Entry Point
 
 # Create a FastAPI application instance with a title for documentation
-app = FastAPI(title="Sudoku API")
+# ORJSONResponse: responses are encoded with orjson instead of the stdlib json module
+app = FastAPI(title="Sudoku API", default_response_class=ORJSONResponse)
+
+# Per-IP rate limits on the public endpoints (over the limit -> 429 Too Many Requests)
+app.state.limiter = limiter
+app.add_exception_handler(RateLimitExceeded, _rate_limit_exceeded_handler)
 
 
 
@@ -29,21 +40,38 @@ app.include_router(gamesession.router)
 def root():
     return {"message": "Welcome to the Sudoku API"}
 
-# Specify the allowed origins
+# Connection pool usage of both engines, for monitoring / alerting on pool exhaustion
+# (checked_out close to size + max_overflow means requests are about to queue for a connection)
+# Unauthenticated, so only served when opted in with ENABLE_POOL_STATUS=1 (keep it off public deployments)
+if os.getenv("ENABLE_POOL_STATUS") == "1":
+    @app.get("/health/db-pool")
+    def db_pool_status():
+        return {
+            "sync": pool_stats(engine.pool),
+            "async": pool_stats(async_engine.pool),
+        }
+
+# Specify the allowed origins (comma-separated FRONTEND_URL, defaults to the Vite dev server)
+# Browsers reject a "*" origin on credentialed requests, so origins must be listed explicitly
 allowed_origins = [
-    # "http://localhost:5173/",  # Replace with your frontend's URL
-    "*",
+    origin.strip()
+    for origin in os.getenv("FRONTEND_URL", "http://localhost:5173").split(",")
+    if origin.strip()
 ]
 
 app.add_middleware(
     CORSMiddleware,
     allow_origins=allowed_origins,  # Allows specific origins
     allow_credentials=True,
-    allow_methods=["*"],  # Allows all HTTP methods
+    allow_methods=["GET", "POST", "PATCH", "DELETE"],  # The methods the API uses
     allow_headers=["*"],  # Allows all HTTP headers
+    max_age=86400,  # Let browsers cache preflight responses for a day
 )
 
 
-# Create all tables in the database (Runs only once at startup)
-# Create tables (only for development, in production use migrations)
-Base.metadata.create_all(bind=engine)
\ No newline at end of file
+# Create missing tables on startup (development only, opt in with AUTO_CREATE_TABLES=1)
+# In production, create / upgrade the schema once with `python migrate.py` instead of on every worker boot
+@app.on_event("startup")
+def create_tables():
+    if os.getenv("AUTO_CREATE_TABLES") == "1":
+        Base.metadata.create_all(bind=engine)
\ No newline at end of file
@@ -0,0 +1,189 @@
+from sqlalchemy import text
+from database import Base, engine
+import models  # Registers every table on Base.metadata
+from utils import BoardStateManager, pack_masks
+
+"""
+Creates the database schema and applies schema changes to an existing database.
+
+This is the production path for setting up / upgrading the schema (the API only
+creates tables itself when started with AUTO_CREATE_TABLES=1).
+
+`Base.metadata.create_all` only creates missing tables, so new columns, indexes
+and data conversions on tables that already exist are listed here instead.
+Every step is written to be idempotent, so the script is safe to re-run
+(and is a no-op on a database freshly created by `create_all`).
+
+Usage (from backend/app):
+    python migrate.py
+"""
+
+
+def check_case_insensitive_duplicates(connection):
+    """Stops before building the lower(username/email) unique indexes if existing users would violate them."""
+    for column in ("username", "email"):
+        duplicates = connection.execute(text(
+            f"SELECT lower({column}) FROM users WHERE {column} IS NOT NULL GROUP BY 1 HAVING count(*) > 1"
+        )).scalars().all()
+        if duplicates:
+            raise RuntimeError(f"Users differing only by case in {column}, resolve them first: {duplicates}")
+
+
+def backfill_board_masks(connection):
+    """Computes the row/col/box masks for sessions created before they were stored."""
+    sessions = connection.execute(text("SELECT id, board_progress FROM game_sessions WHERE row_mask IS NULL")).all()
+
+    for session_id, board_progress in sessions:
+        row_masks, col_masks, box_masks = BoardStateManager.build_masks(bytes(board_progress))
+        connection.execute(
+            text("UPDATE game_sessions SET row_mask = :row_mask, col_mask = :col_mask, box_mask = :box_mask WHERE id = :id"),
+            {
+                "id": session_id,
+                "row_mask": pack_masks(row_masks),
+                "col_mask": pack_masks(col_masks),
+                "box_mask": pack_masks(box_masks),
+            },
+        )
+
+
+# Ordered list of (description, [SQL statements or Python steps taking the connection])
+MIGRATIONS = [
+    (
+        "Copy the board solution onto game_sessions",
+        [
+            "ALTER TABLE game_sessions ADD COLUMN IF NOT EXISTS solution TEXT",
+            """
+            DO $$
+            BEGIN
+                IF (SELECT data_type FROM information_schema.columns
+                    WHERE table_name = 'game_sessions' AND column_name = 'solution') = 'text' THEN
+                    UPDATE game_sessions gs
+                    SET solution = b.solution
+                    FROM boards b
+                    WHERE gs.board_id = b.id AND gs.solution IS NULL;
+                END IF;
+            END $$
+            """,
+            "ALTER TABLE game_sessions ALTER COLUMN solution SET NOT NULL",
+        ],
+    ),
+    (
+        "Store game_sessions board state as 81 raw cell bytes instead of JSON",
+        [
+            # '[[0, 0, 3, ...], ...]' -> '003...' -> one byte per digit
+            r"""
+            DO $$
+            BEGIN
+                IF (SELECT data_type FROM information_schema.columns
+                    WHERE table_name = 'game_sessions' AND column_name = 'board_progress') = 'text' THEN
+                    ALTER TABLE game_sessions
+                        ALTER COLUMN board_progress TYPE BYTEA
+                            USING decode(regexp_replace(translate(board_progress, '[], ', ''), '(.)', '0\1', 'g'), 'hex'),
+                        ALTER COLUMN solution TYPE BYTEA
+                            USING decode(regexp_replace(translate(solution, '[], ', ''), '(.)', '0\1', 'g'), 'hex');
+                END IF;
+            END $$
+            """,
+        ],
+    ),
+    (
+        "Store row/column/box value masks on game_sessions",
+        [
+            "ALTER TABLE game_sessions ADD COLUMN IF NOT EXISTS row_mask BYTEA",
+            "ALTER TABLE game_sessions ADD COLUMN IF NOT EXISTS col_mask BYTEA",
+            "ALTER TABLE game_sessions ADD COLUMN IF NOT EXISTS box_mask BYTEA",
+            backfill_board_masks,
+            "ALTER TABLE game_sessions ALTER COLUMN row_mask SET NOT NULL",
+            "ALTER TABLE game_sessions ALTER COLUMN col_mask SET NOT NULL",
+            "ALTER TABLE game_sessions ALTER COLUMN box_mask SET NOT NULL",
+        ],
+    ),
+    (
+        "Index game_sessions.user_id (unique: one active session per user)",
+        [
+            # Keep only the newest session per user so the unique index can be built
+            """
+            DELETE FROM game_sessions gs
+            USING game_sessions newer
+            WHERE gs.user_id = newer.user_id AND gs.id < newer.id
+            """,
+            "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS ix_game_sessions_user_id ON game_sessions (user_id)",
+        ],
+    ),
+    (
+        "Track the filled cell count on game_sessions",
+        [
+            "ALTER TABLE game_sessions ADD COLUMN IF NOT EXISTS filled_count INTEGER",
+            """
+            UPDATE game_sessions
+            SET filled_count = (
+                SELECT count(*) FROM generate_series(0, 80) AS i WHERE get_byte(board_progress, i) <> 0
+            )
+            WHERE filled_count IS NULL
+            """,
+            "ALTER TABLE game_sessions ALTER COLUMN filled_count SET NOT NULL",
+        ],
+    ),
+    (
+        "Index completed_boards by (user_id, completed_at DESC) and game_sessions by started_at DESC",
+        [
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_completed_boards_user_id_completed_at ON completed_boards (user_id, completed_at DESC)",
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_game_sessions_started_at ON game_sessions (started_at DESC)",
+        ],
+    ),
+    (
+        "Replace the boards.difficulty index with a covering (difficulty) INCLUDE (id) index",
+        [
+            "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_boards_difficulty_id ON boards (difficulty) INCLUDE (id)",
+            "DROP INDEX CONCURRENTLY IF EXISTS ix_boards_difficulty",
+        ],
+    ),
+    (
+        "Store boards puzzle/solution as 81-digit strings instead of JSON",
+        [
+            # '[[0, 0, 3, ...], ...]' -> '003...'
+            """
+            DO $$
+            BEGIN
+                IF (SELECT data_type FROM information_schema.columns
+                    WHERE table_name = 'boards' AND column_name = 'puzzle') = 'text' THEN
+                    ALTER TABLE boards
+                        ALTER COLUMN puzzle TYPE VARCHAR(81) USING translate(puzzle, '[], ', ''),
+                        ALTER COLUMN solution TYPE VARCHAR(81) USING translate(solution, '[], ', '');
+                END IF;
+            END $$
+            """,
+        ],
+    ),
+    (
+        "Add case-insensitive unique indexes on users lower(username) and lower(email)",
+        [
+            check_case_insensitive_duplicates,
+            "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS ix_users_username_lower ON users (lower(username))",
+            "CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS ix_users_email_lower ON users (lower(email))",
+        ],
+    ),
+]
+
+
+def run_migrations():
+    """Create any missing tables, then run every migration step in order."""
+    print("➡️  Create missing tables")
+    Base.metadata.create_all(bind=engine)
+
+    # AUTOCOMMIT so statements that can't run inside a transaction block
+    # (e.g. CREATE INDEX CONCURRENTLY) work too
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+        for description, statements in MIGRATIONS:
+            print(f"➡️  {description}")
+            for statement in statements:
+                if callable(statement):
+                    statement(connection)
+                else:
+                    connection.execute(text(statement))
+
+    print("✅ Migrations applied.")
+
+
+if __name__ == "__main__":
+    run_migrations()
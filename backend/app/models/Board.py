@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Text, String, Boolean, Numeric, TIMESTAMP, ForeignKey, func, Float, Interval, ARRAY
+from sqlalchemy import Column, Integer, Text, String, Boolean, Numeric, TIMESTAMP, ForeignKey, func, Float, Interval, ARRAY, Index
 from database import Base
 from sqlalchemy.orm import relationship
 
@@ -10,8 +10,8 @@ class Board(Base):
     __tablename__ = "boards"
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
-    puzzle = Column(Text, nullable=False)  # Stores the board as a string (e.g., comma-separated or JSON)
-    solution = Column(Text, nullable=False)  # Stores the solution as a string
+    puzzle = Column(String(81), nullable=False)  # 81-digit string, row-major (0 = empty cell)
+    solution = Column(String(81), nullable=False)  # 81-digit string, row-major
     difficulty = Column(String(10), nullable=False, default="unknown")  # Difficulty level (easy, medium, hard, expert)
     created_at = Column(TIMESTAMP, server_default=func.now())  # Auto timestamp
 
@@ -22,5 +22,11 @@ class Board(Base):
     times_completed = Column(Integer, default=0)
     tags = Column(ARRAY(String))  # Requires PostgreSQL
 
+    # Difficulty lookups (filters, counts, random picks) by index; INCLUDE (id) lets
+    # queries that only need ids by difficulty be answered from the index alone
+    __table_args__ = (
+        Index("ix_boards_difficulty_id", "difficulty", postgresql_include=["id"]),
+    )
+
     #  lets you query related models more easily
     sessions = relationship("GameSession", back_populates="board")
\ No newline at end of file
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Text, String, Boolean, Numeric, TIMESTAMP, ForeignKey, func, Float, Interval, ARRAY
+from sqlalchemy import Column, Integer, Text, String, Boolean, Numeric, TIMESTAMP, ForeignKey, func, Float, Interval, ARRAY, Index
 from database import Base
 from sqlalchemy.orm import relationship
 
@@ -16,4 +16,9 @@ class CompletedBoard(Base):
     completed_at = Column(TIMESTAMP, server_default=func.now())  # Timestamp of completion
     total_time_spent = Column(Integer, nullable=False)
     hints_used = Column(Integer, nullable=False, default=0)
-    mistakes_made = Column(Integer, nullable=False, default=0)
\ No newline at end of file
+    mistakes_made = Column(Integer, nullable=False, default=0)
+
+    # A user's completed boards, most recent first (history / leaderboard reads)
+    __table_args__ = (
+        Index("ix_completed_boards_user_id_completed_at", user_id, completed_at.desc()),
+    )
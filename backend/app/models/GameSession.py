@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Text, String, Boolean, Numeric, TIMESTAMP, ForeignKey, func, Float, Interval, ARRAY
+from sqlalchemy import Column, Integer, Text, String, Boolean, Numeric, TIMESTAMP, ForeignKey, func, Float, Interval, ARRAY, LargeBinary, Index
 from database import Base
 from sqlalchemy.orm import relationship
 
@@ -8,13 +8,21 @@ class GameSession(Base):
     Represents an active game session for a user.
     """
     __tablename__ = "game_sessions"
+    # Fetch server-generated columns (started_at, last_active_at) with RETURNING on INSERT
+    __mapper_args__ = {"eager_defaults": True}
 
     id = Column(Integer, primary_key=True, index=True, autoincrement=True)
     
-    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False, index=True, unique=True)  # At most one active session per user
     board_id = Column(Integer, ForeignKey("boards.id", ondelete="CASCADE"), nullable=False)
     
-    board_progress = Column(Text, nullable=False) 
+    board_progress = Column(LargeBinary(81), nullable=False)  # 81 cell bytes, index = row * 9 + col (0 = empty)
+    solution = Column(LargeBinary(81), nullable=False)  # Copied from the Board at creation so moves never need to load it
+    # Values present in each row / column / 3x3 box as 9 uint16 bitmasks, kept in sync with board_progress
+    row_mask = Column(LargeBinary(18), nullable=False)
+    col_mask = Column(LargeBinary(18), nullable=False)
+    box_mask = Column(LargeBinary(18), nullable=False)
+    filled_count = Column(Integer, nullable=False, default=0)  # Non-empty cells in board_progress, updated per move
     completion_percentage = Column(Numeric(5,2), default=0.00)
     current_score = Column(Integer, default=0)
     hints_used = Column(Integer, default=0)
@@ -23,6 +31,12 @@ class GameSession(Base):
     started_at = Column(TIMESTAMP, server_default=func.current_timestamp())
     last_active_at = Column(TIMESTAMP, server_default=func.current_timestamp())
     elapsed_time = Column(Integer, default=0)
+
+    # Sessions by most recent start. user_id is already unique (one session per user),
+    # so a (user_id, started_at) index would add nothing over ix_game_sessions_user_id
+    __table_args__ = (
+        Index("ix_game_sessions_started_at", started_at.desc()),
+    )
     
     # lets you query related models more easily
     # Specify foreign_keys to resolve ambiguity between User.active_game_id and GameSession.user_id
@@ -35,7 +49,6 @@ class GameSession(Base):
     board = relationship("Board")
 
     # ADD
-    # Add solution field to GameSession to avoid repeated database lookups
     # Add initial_board field to track the starting state
     # Add is_paused boolean field for proper time tracking
     # Add remaining_hints field to limit hints per game
\ No newline at end of file
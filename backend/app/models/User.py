@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Text, String, Boolean, Numeric, TIMESTAMP, ForeignKey, func, Float, Interval, ARRAY
+from sqlalchemy import Column, Integer, Text, String, Boolean, Numeric, TIMESTAMP, ForeignKey, func, Float, Interval, ARRAY, Index
 from database import Base
 from sqlalchemy.orm import relationship
 
@@ -53,6 +53,12 @@ class User(Base):
 
     streak_count = Column(Integer, default=0)
 
+    # Usernames and emails are unique case-insensitively; these indexes also serve the lower(...) lookups at login
+    __table_args__ = (
+        Index("ix_users_username_lower", func.lower(username), unique=True),
+        Index("ix_users_email_lower", func.lower(email), unique=True),
+    )
+
     # lets you query related models more easily
     # Specify primaryjoin to resolve ambiguity: User has active_game_id pointing to GameSession,
     # but GameSession.user_id points back to User. We want the relationship based on user_id.
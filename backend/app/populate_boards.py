@@ -1,14 +1,25 @@
-import requests
-import json
-from time import sleep
+import asyncio
+import httpx
+import hashlib
+import orjson
+from typing import List, Optional
+from sqlalchemy import insert
 from sqlalchemy.orm import Session
 from database import SessionLocal
 from models import Board
+from utils import grid_to_digits
 
 # Simple API URL to fetch Sudoku puzzles (recommended for now)
 SUDOKU_API_URL = "https://sudoku-api.vercel.app/api/dosuku"
 # or: https://sudoku-api.vercel.app/api/dosuku?query={newboard(limit:1){grids{value,solution,difficulty},results,message}}
 
+# Concurrent fetching limits: at most this many requests in flight, started at most this many per second
+MAX_CONCURRENT_FETCHES = 8
+MAX_FETCHES_PER_SECOND = 4
+
+# Number of boards requested from the API per round
+FETCH_BATCH_SIZE = 16
+
 # Target number of boards per difficulty
 TARGET_COUNT_PER_DIFFICULTY = {
     "easy": 50,
@@ -20,26 +31,31 @@ TARGET_COUNT_PER_DIFFICULTY = {
 # Max consecutive retries allowed when no new puzzle is found
 MAX_RETRIES_WITHOUT_NEW = 100
 
+# Number of new boards buffered before they are inserted in one batch
+BATCH_SIZE = 25
+
 
-def fetch_board():
+async def fetch_board(client: httpx.AsyncClient) -> Optional[dict]:
     """Fetch a single Sudoku board from the API."""
     
     try:
-        response = requests.get(SUDOKU_API_URL, timeout=10)
+        response = await client.get(SUDOKU_API_URL)
         response.raise_for_status()
 
-        board_data = response.json()["newboard"]["grids"][0]
+        board_data = orjson.loads(response.content)["newboard"]["grids"][0]
         return {
-            "puzzle": json.dumps(board_data["value"]),
-            "solution": json.dumps(board_data["solution"]),
+            "puzzle": grid_to_digits(board_data["value"]),  # Stored as 81-digit strings
+            "solution": grid_to_digits(board_data["solution"]),
             "difficulty": board_data["difficulty"].lower()
         }
     
-    except (requests.RequestException, KeyError, IndexError) as e:
-        print(f"❌ HTTP Error: {e} | Status Code: {response.status_code}")
-    except requests.exceptions.Timeout:
+    except httpx.HTTPStatusError as e:
+        print(f"❌ HTTP Error: {e} | Status Code: {e.response.status_code}")
+    except (orjson.JSONDecodeError, KeyError, IndexError) as e:
+        print(f"❌ Unexpected response format: {e}")
+    except httpx.TimeoutException:
         print("⏳ Request timed out. The server took too long to respond.")
-    except requests.exceptions.RequestException as e:
+    except httpx.RequestError as e:
         print(f"❌ Request failed: {e}")
     except Exception as e:
         print(f"⚠️ Unexpected error: {e}")
@@ -47,12 +63,52 @@ def fetch_board():
     return None
 
 
+async def fetch_boards(client: httpx.AsyncClient, count: int) -> List[dict]:
+    """
+    Fetch `count` boards concurrently, keeping at most MAX_CONCURRENT_FETCHES requests
+    in flight and starting at most MAX_FETCHES_PER_SECOND (failed fetches are dropped).
+    """
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_FETCHES)
+
+    async def fetch_after(delay: float) -> Optional[dict]:
+        await asyncio.sleep(delay)  # Space out request starts to respect the rate limit
+        async with semaphore:
+            return await fetch_board(client)
+
+    boards = await asyncio.gather(*(fetch_after(i / MAX_FETCHES_PER_SECOND) for i in range(count)))
+    return [board for board in boards if board]
+
+
+def board_key(puzzle: str, solution: str) -> bytes:
+    """Compact 8-byte digest of a board, used for in-memory duplicate detection."""
+    return hashlib.blake2b(f"{puzzle}|{solution}".encode(), digest_size=8).digest()
+
+
 def board_exists(db: Session, puzzle: str, solution: str) -> bool:
     """Check if a board already exists in the database."""
     return db.query(Board).filter_by(puzzle=puzzle, solution=solution).first() is not None
 
 
-def populate_boards():
+def is_duplicate(db: Session, board: dict, pending: list) -> bool:
+    """Confirm a digest match against the boards still queued for insert, then the database."""
+    return any(
+        queued["puzzle"] == board["puzzle"] and queued["solution"] == board["solution"]
+        for queued in pending
+    ) or board_exists(db, board["puzzle"], board["solution"])
+
+
+def insert_boards(db: Session, pending: list):
+    """Insert the buffered boards in a single batched INSERT and commit, then clear the buffer."""
+    if not pending:
+        return
+
+    db.execute(insert(Board), pending)
+    db.commit()
+    print(f"💾 Inserted {len(pending)} boards")
+    pending.clear()
+
+
+async def populate_boards():
     """Populate the database with Sudoku boards until the target is met for each difficulty."""
     
     db = SessionLocal()
@@ -60,52 +116,66 @@ def populate_boards():
     # Track how many we have added for each difficulty
     difficulty_counts = {diff: 0 for diff in TARGET_COUNT_PER_DIFFICULTY}
     retry_counter = 0
+    pending = []  # New boards waiting to be inserted
+
+    # Load a digest of every stored board once so duplicates are detected in memory
+    # instead of with one query per fetch (new boards are added as they are queued).
+    # 8-byte digests keep this ~10x smaller than a set of the puzzle strings; a digest
+    # match is confirmed against the real board, so a (very unlikely) collision can't drop a new board
+    seen = {board_key(puzzle, solution) for puzzle, solution in db.query(Board.puzzle, Board.solution).yield_per(1000)}
 
     try:
-        while True:
-            # Stop if all difficulties are filled
-            if all(difficulty_counts[diff] >= TARGET_COUNT_PER_DIFFICULTY[diff] for diff in difficulty_counts):
-                print("✅ Target board count reached for all difficulties.")
-                break
-
-            board = fetch_board()
-            if not board:
-                continue  # Skip this round if API failed
-
-            difficulty = board["difficulty"]
-            
-            # Skip unknown difficulties
-            if difficulty not in TARGET_COUNT_PER_DIFFICULTY:
-                print(f"Skipping unknown difficulty: {difficulty}")
-                continue
-
-            if difficulty_counts[difficulty] >= TARGET_COUNT_PER_DIFFICULTY[difficulty]:
-                continue  # Already reached goal for this difficulty
-
-            if board_exists(db, board["puzzle"], board["solution"]):
-                retry_counter += 1
+        # Keep-alive connections are reused across fetches; connection failures are retried
+        async with httpx.AsyncClient(
+            timeout=10,
+            limits=httpx.Limits(max_connections=MAX_CONCURRENT_FETCHES),
+            transport=httpx.AsyncHTTPTransport(retries=3),
+        ) as client:
+            while True:
+                # Stop if all difficulties are filled
+                if all(difficulty_counts[diff] >= TARGET_COUNT_PER_DIFFICULTY[diff] for diff in difficulty_counts):
+                    print("✅ Target board count reached for all difficulties.")
+                    break
+
                 if retry_counter >= MAX_RETRIES_WITHOUT_NEW:
                     print("⚠️ Stopping: Max retries reached without finding new boards.")
                     break
-                continue
 
-            # Add new board to the database
-            new_board = Board(
-                puzzle=board["puzzle"],
-                solution=board["solution"],
-                difficulty=difficulty
-            )
-            db.add(new_board)
-            db.commit()
-            db.refresh(new_board)
+                # Fetch a round of boards concurrently, then filter them here
+                # (the database work runs between rounds, while no requests are in flight)
+                for board in await fetch_boards(client, FETCH_BATCH_SIZE):
+                    difficulty = board["difficulty"]
+
+                    # Skip unknown difficulties
+                    if difficulty not in TARGET_COUNT_PER_DIFFICULTY:
+                        print(f"Skipping unknown difficulty: {difficulty}")
+                        continue
+
+                    if difficulty_counts[difficulty] >= TARGET_COUNT_PER_DIFFICULTY[difficulty]:
+                        continue  # Already reached goal for this difficulty
+
+                    key = board_key(board["puzzle"], board["solution"])
+                    if key in seen and is_duplicate(db, board, pending):
+                        retry_counter += 1
+                        continue
+
+                    # Queue the new board, inserting a full batch at a time
+                    seen.add(key)
+                    pending.append(board)
+                    if len(pending) >= BATCH_SIZE:
+                        insert_boards(db, pending)
+
+                    difficulty_counts[difficulty] += 1
+                    retry_counter = 0  # Reset on successful new board
 
-            difficulty_counts[difficulty] += 1
-            retry_counter = 0  # Reset on successful new board
+                    print(f"✅ Added {difficulty.capitalize()} board | Counts: {difficulty_counts}")
 
-            print(f"✅ Added {difficulty.capitalize()} board | ID: {new_board.id} | Counts: {difficulty_counts}")
+        # Insert whatever is left in the last (partial) batch
+        insert_boards(db, pending)
 
-            # Optional: throttle to avoid overloading API
-            sleep(0.25)
+    except BaseException:
+        db.rollback()  # Leave the session clean so close() doesn't hide the original error
+        raise
 
     finally:
         db.close()
@@ -116,4 +186,4 @@ def populate_boards():
 
 
 if __name__ == "__main__":
-    populate_boards()
+    asyncio.run(populate_boards())
@@ -1,18 +1,21 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Request, status
 from sqlalchemy.orm import Session
-from sqlalchemy import or_
+from sqlalchemy import func
 
 from models import User
 from schemas import UserLogin, Token
 from database import get_db
-from security import verify_password, create_access_token
+from security import verify_and_update_password_cached, create_access_token
+from limiter import limiter
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
 
-# Login endpoint
+# Login endpoint (sync `def` so the bcrypt check runs in FastAPI's threadpool, not on the event loop)
+# Rate limited per client IP to slow down password guessing
 @router.post("/login", response_model=Token)
-def login(user_credentials: UserLogin, db: Session = Depends(get_db)):
+@limiter.limit("30/minute")
+def login(request: Request, user_credentials: UserLogin, db: Session = Depends(get_db)):
     """
     Authenticates a user and returns a JWT token if valid.
 
@@ -21,15 +24,12 @@ def login(user_credentials: UserLogin, db: Session = Depends(get_db)):
     - Returns a signed JWT access token on success.
     """
     
-    # Check if user exists
-    # user = db.query(User).filter((User.username == user_credentials.login) | (User.email == user_credentials.login)).first()
-
-    user = db.query(User).filter(
-        or_(
-            User.username == user_credentials.login,
-            User.email == user_credentials.login
-        )
-    ).first()
+    # Check if user exists (case insensitive). Two single-index probes instead of
+    # `username = :login OR email = :login`, which can't use either index
+    login = user_credentials.login.lower()
+    user = db.query(User).filter(func.lower(User.username) == login).first()
+    if not user:
+        user = db.query(User).filter(func.lower(User.email) == login).first()
     
     # If no user found, raise specific error
     if not user:
@@ -40,13 +40,19 @@ def login(user_credentials: UserLogin, db: Session = Depends(get_db)):
         )
     
     # If user exists but password is wrong
-    if not verify_password(user_credentials.password, user.password_hash):
+    is_valid, new_hash = verify_and_update_password_cached(user.id, user_credentials.password, user.password_hash)
+    if not is_valid:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect password",  # Specific about password failure
             headers={"WWW-Authenticate": "Bearer"},
         )
 
+    # Re-hash passwords stored with outdated settings (e.g. a higher bcrypt cost)
+    if new_hash:
+        user.password_hash = new_hash
+        db.commit()
+
     # Create JWT payload (you can include more fields if needed)
     data = {
         "user_id": str(user.id),
@@ -1,117 +1,131 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
 
-from database import get_db
+from database import get_async_db
 from models import Board
 from schemas import BoardResponse, BoardUpdate
-
-import random
+from crud import board_crud
 
 
 router = APIRouter(prefix="/boards", tags=["Boards"])
 
+# The paged list routes return board_crud.get_boards dicts as-is (ORJSONResponse, the app default):
+# response_model=None skips re-validating every row, `responses` keeps the BoardResponse schema in the docs
+
 @router.get("/")
-def root():
+async def root():
     return {"message": "Now in the boards route"}
 
 
-@router.get("/allboards", response_model=List[BoardResponse])
-def get_all_boards(db: Session = Depends(get_db)):
+@router.get("/allboards", response_model=None, responses={200: {"model": List[BoardResponse]}})
+async def get_all_boards(
+    after_id: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=200),
+    db: AsyncSession = Depends(get_async_db)
+):
     """
-    Fetch all Sudoku boards from the database.
+    Fetch Sudoku boards from the database, one page at a time (pass the last id received as `after_id`).
     """
-    boards = db.query(Board).all()
-    return boards
+    return await board_crud.get_boards(db, after_id=after_id, limit=limit)
 
-@router.get("/easy", response_model=List[BoardResponse])
-def get_easy_boards(db: Session = Depends(get_db)):
+@router.get("/easy", response_model=None, responses={200: {"model": List[BoardResponse]}})
+async def get_easy_boards(
+    after_id: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=200),
+    db: AsyncSession = Depends(get_async_db)
+):
     """
-    Fetch all 'easy' difficulty boards.
+    Fetch 'easy' difficulty boards, one page at a time (pass the last id received as `after_id`).
     """
-    boards = db.query(Board).filter(Board.difficulty == "easy").all()
-    return boards
+    return await board_crud.get_boards(db, "easy", after_id=after_id, limit=limit)
 
-@router.get("/medium", response_model=List[BoardResponse])
-def get_medium_boards(db: Session = Depends(get_db)):
+@router.get("/medium", response_model=None, responses={200: {"model": List[BoardResponse]}})
+async def get_medium_boards(
+    after_id: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=200),
+    db: AsyncSession = Depends(get_async_db)
+):
     """
-    Fetch all 'medium' difficulty boards.
+    Fetch 'medium' difficulty boards, one page at a time (pass the last id received as `after_id`).
     """
-    boards = db.query(Board).filter(Board.difficulty == "medium").all()
-    return boards
+    return await board_crud.get_boards(db, "medium", after_id=after_id, limit=limit)
 
-@router.get("/hard", response_model=List[BoardResponse])
-def get_hard_boards(db: Session = Depends(get_db)):
+@router.get("/hard", response_model=None, responses={200: {"model": List[BoardResponse]}})
+async def get_hard_boards(
+    after_id: int = Query(0, ge=0),
+    limit: int = Query(50, ge=1, le=200),
+    db: AsyncSession = Depends(get_async_db)
+):
     """
-    Fetch all 'hard' difficulty boards.
+    Fetch 'hard' difficulty boards, one page at a time (pass the last id received as `after_id`).
     """
-    boards = db.query(Board).filter(Board.difficulty == "hard").all()
-    return boards
+    return await board_crud.get_boards(db, "hard", after_id=after_id, limit=limit)
 
 @router.get("/boardid/{board_id}", response_model=BoardResponse)
-def get_board_by_id(board_id: int, db: Session = Depends(get_db)):
+async def get_board_by_id(board_id: int, db: AsyncSession = Depends(get_async_db)):
     """
     Fetch a specific board by its ID.
     Raises 404 if not found.
     """
-    board = db.query(Board).filter(Board.id == board_id).first()
+    board = await db.get(Board, board_id)
     if not board:
         raise HTTPException(status_code=404, detail="Board not found.")
     
     return board
 
 @router.get("/random", response_model=BoardResponse)
-def get_random_board(db: Session = Depends(get_db)):
+async def get_random_board(db: AsyncSession = Depends(get_async_db)):
     """
     Return a random board from any difficulty.
     """
-    boards = db.query(Board).all()
-    if not boards:
+    board = await board_crud.get_random_board(db)
+    if not board:
         raise HTTPException(status_code=404, detail="No boards available.")
     
-    return random.choice(boards)
+    return board
 
 @router.get("/random/easy", response_model=BoardResponse)
-def get_random_easy_board(db: Session = Depends(get_db)):
+async def get_random_easy_board(db: AsyncSession = Depends(get_async_db)):
     """
     Return a random board with difficulty 'easy'.
     """
-    boards = db.query(Board).filter(Board.difficulty == "easy").all()
-    if not boards:
+    board = await board_crud.get_random_board(db, "easy")
+    if not board:
         raise HTTPException(status_code=404, detail="No easy boards available.")
     
-    return random.choice(boards)
+    return board
 
 @router.get("/random/medium", response_model=BoardResponse)
-def get_random_medium_board(db: Session = Depends(get_db)):
+async def get_random_medium_board(db: AsyncSession = Depends(get_async_db)):
     """
     Return a random board with difficulty 'medium'.
     """
-    boards = db.query(Board).filter(Board.difficulty == "medium").all()
-    if not boards:
+    board = await board_crud.get_random_board(db, "medium")
+    if not board:
         raise HTTPException(status_code=404, detail="No medium boards available.")
     
-    return random.choice(boards)
+    return board
 
 @router.get("/random/hard", response_model=BoardResponse)
-def get_random_hard_board(db: Session = Depends(get_db)):
+async def get_random_hard_board(db: AsyncSession = Depends(get_async_db)):
     """
     Return a random board with difficulty 'hard'.
     """
-    boards = db.query(Board).filter(Board.difficulty == "hard").all()
-    if not boards:
+    board = await board_crud.get_random_board(db, "hard")
+    if not board:
         raise HTTPException(status_code=404, detail="No hard boards available.")
     
-    return random.choice(boards)
+    return board
 
 @router.patch("/updateboard/{board_id}", response_model=BoardUpdate)
-def update_board(board_id: int, update_data: BoardUpdate, db: Session = Depends(get_db)):
+async def update_board(board_id: int, update_data: BoardUpdate, db: AsyncSession = Depends(get_async_db)):
     """
     Update a board's stats or tags.
     Only fields provided in the request will be updated.
     """
     # Find board by its id
-    board = db.query(Board).filter(Board.id == board_id).first()
+    board = await db.get(Board, board_id)
     if not board:
         raise HTTPException(status_code=404, detail="Board not found")
 
@@ -124,49 +138,45 @@ def update_board(board_id: int, update_data: BoardUpdate, db: Session = Depends(
         setattr(board, key, value)
 
     # Save changes to the database
-    db.commit()
-    db.refresh(board)
+    await db.commit()
 
     # Return the updated board (only includes fields from BoardUpdate schema)
     return board
 
 @router.delete("/delete/{board_id}")
-def delete_board(board_id: int, db: Session = Depends(get_db)):
+async def delete_board(board_id: int, db: AsyncSession = Depends(get_async_db)):
     """
     Delete a board by its ID.
     """
-    board = db.query(Board).filter(Board.id == board_id).first()
+    board = await db.get(Board, board_id)
     if not board:
         raise HTTPException(status_code=404, detail="Board not found")
 
-    # db.delete(board)
-    # db.commit()
+    # await db.delete(board)
+    # await db.commit()
 
     return {"message": f"Board {board_id} deleted successfully."}
 
 # Route to get the count of easy boards
 @router.get("/count/easy", response_model=int)
-def get_easy_count(db: Session = Depends(get_db)):
+async def get_easy_count(db: AsyncSession = Depends(get_async_db)):
     """
     Get the count of boards with difficulty 'easy'.
     """
-    count = db.query(Board).filter(Board.difficulty == 'easy').count()
-    return count
+    return await board_crud.count_boards(db, "easy")
 
 # Route to get the count of medium boards
 @router.get("/count/medium", response_model=int)
-def get_medium_count(db: Session = Depends(get_db)):
+async def get_medium_count(db: AsyncSession = Depends(get_async_db)):
     """
     Get the count of boards with difficulty 'medium'.
     """
-    count = db.query(Board).filter(Board.difficulty == 'medium').count()
-    return count
+    return await board_crud.count_boards(db, "medium")
 
 # Route to get the count of hard boards
 @router.get("/count/hard", response_model=int)
-def get_hard_count(db: Session = Depends(get_db)):
+async def get_hard_count(db: AsyncSession = Depends(get_async_db)):
     """
     Get the count of boards with difficulty 'hard'.
     """
-    count = db.query(Board).filter(Board.difficulty == 'hard').count()
-    return count
\ No newline at end of file
+    return await board_crud.count_boards(db, "hard")
\ No newline at end of file
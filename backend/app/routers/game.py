@@ -1,22 +1,34 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
-import json
-import random
+from fastapi import APIRouter, Depends, HTTPException, Request
+from sqlalchemy.ext.asyncio import AsyncSession
+from functools import lru_cache
 
 # Import database session dependency and models
-from database import get_db
-from models import Board
+from database import get_async_db
 from schemas import BoardResponse
+from crud import board_crud
+from utils import digits_to_grid
+from limiter import limiter
 
 # Create a router for game-related endpoints with a prefix and tag for API docs
 router = APIRouter(prefix="/game", tags=["Game"])
 
+@lru_cache(maxsize=1024)
+def parse_board(board_id: int, puzzle: str, solution: str):
+    """
+    Expands a board's 81-digit puzzle and solution strings into 9x9 grids.
+    Boards never change, so the grids are cached (treat them as read-only).
+    """
+    return digits_to_grid(puzzle), digits_to_grid(solution)
+
+
 @router.get("/")
-def get_new_game(difficulty: str = "random", db: Session = Depends(get_db)):
+@limiter.limit("60/minute")
+async def get_new_game(request: Request, difficulty: str = "random", db: AsyncSession = Depends(get_async_db)):
     """
     Retrieve a new playable Sudoku game.
     
     Args:
+        request: The incoming request (used for per-IP rate limiting)
         difficulty: The difficulty level ('easy', 'medium', 'hard', or 'random')
         db: Database session (injected by FastAPI)
     
@@ -27,29 +39,24 @@ def get_new_game(difficulty: str = "random", db: Session = Depends(get_db)):
         - difficulty: The difficulty level of the puzzle
         - board_id: The database ID of the board
     """
-    # Fetch a board based on difficulty preference
+    # Fetch a board based on difficulty preference (handed out from a pool of random picks, see take_random_board)
     if difficulty == "random":
-        # Get all boards and pick one randomly
-        boards = db.query(Board).all()
-        if not boards:
+        board = await board_crud.take_random_board(db)
+        if not board:
             raise HTTPException(status_code=404, detail="No boards available in database")
-        board = random.choice(boards)
     else:
         # Filter by specific difficulty
-        boards = db.query(Board).filter(Board.difficulty == difficulty.lower()).all()
-        if not boards:
+        board = await board_crud.take_random_board(db, difficulty.lower())
+        if not board:
             raise HTTPException(
                 status_code=404, 
                 detail=f"No {difficulty} boards available. Try 'random' or populate the database."
             )
-        board = random.choice(boards)
     
-    # Parse the puzzle and solution from JSON strings stored in database
-    # The database stores them as JSON strings, so we need to parse them
+    # The database stores the puzzle and solution as 81-digit strings; the frontend expects 9x9 grids
     try:
-        puzzle = json.loads(board.puzzle)
-        solution = json.loads(board.solution)
-    except json.JSONDecodeError:
+        puzzle, solution = parse_board(board.id, board.puzzle, board.solution)
+    except ValueError:
         # If parsing fails, raise an error
         raise HTTPException(
             status_code=500, 
@@ -65,6 +72,6 @@ def get_new_game(difficulty: str = "random", db: Session = Depends(get_db)):
     }
 
 @router.post("/new")
-def create_game():
+async def create_game():
     """Create a new Sudoku game."""
     return {"message": "New Sudoku game created"}
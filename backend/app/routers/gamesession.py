@@ -1,10 +1,10 @@
-from fastapi import APIRouter, Body, Depends, HTTPException, status
+from fastapi import APIRouter, Body, Depends, HTTPException, Query, status
 from sqlalchemy.orm import Session
 from typing import Optional
 from datetime import datetime, timezone
 from database import get_db
 from models import GameSession
-from schemas import GameSessionResponse, GameSessionCreate, GameSessionUpdate, CompletedBoardCreate, CompletedBoardResponse
+from schemas import GameSessionResponse, GameSessionCreate, GameSessionUpdate, CompletedBoardResponse
 
 from crud import gamesession_crud, completedboard_crud
 
@@ -34,7 +34,7 @@ def make_move(
     db: Session = Depends(get_db)
 ):
     """Make a move in the current game"""
-    session = gamesession_crud.get_active_game_session(db, session_id)
+    session = gamesession_crud.get_active_game_session_cached(db, session_id)
     if not session:
         raise HTTPException(status_code=404, detail="Game session not found")
         
@@ -75,24 +75,15 @@ def get_active_game_session(user_id: int, db: Session = Depends(get_db)):
 
 
 @router.patch("/update/{user_id}", response_model=GameSessionResponse)
-def update_game_session(user_id: int, session_updates: GameSessionUpdate, db: Session = Depends(get_db)):
+async def update_game_session(user_id: int, session_updates: GameSessionUpdate):
     """
     Update the game session with new progress data.
     
     Only the provided fields will be updated (partial update).
+    Updates for the same user arriving within 200 ms are merged and written together
+    (see SessionUpdateBatcher); 404 if the user has no active session.
     """
-    # 1. Get the active game session for the user
-    session = gamesession_crud.get_active_game_session(db, user_id)
-    if not session:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="No active session found for this user."
-        )
-
-    # 2. Update only the fields that were provided
-    updated_session = gamesession_crud.update_game_session(db, session, session_updates)
-    
-    return updated_session
+    return await gamesession_crud.session_update_batcher.submit(user_id, session_updates)
 
 ##### Do an update_cell where just the position and number is sent in and it is validated (or might just be update, and have to change thinking)
 @router.patch("/update_cell/{user_id}", response_model=GameSessionResponse)
@@ -112,7 +103,7 @@ def update_cell(
     - Mistake tracking
     - Completion checking
     """
-    session = gamesession_crud.get_active_game_session(db, user_id)
+    session = gamesession_crud.get_active_game_session_cached(db, user_id)
     if not session:
         raise HTTPException(status_code=404, detail="No active session found")
     
@@ -150,11 +141,15 @@ def end_game_session(user_id: int, db: Session = Depends(get_db)):
 
 
 @router.get("/allgamesessions", response_model=list[GameSessionResponse])
-def get_game_sessions(db: Session = Depends(get_db)):
+def get_game_sessions(
+    after_id: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=500),
+    db: Session = Depends(get_db)
+):
     """
-    Retrieve all game sessions.
+    Retrieve game sessions, one page at a time (pass the last id received as `after_id`).
     """
-    return gamesession_crud.get_game_sessions(db)
+    return gamesession_crud.get_game_sessions(db, after_id=after_id, limit=limit)
 
 
 
@@ -162,7 +157,8 @@ def get_game_sessions(db: Session = Depends(get_db)):
 def complete_game(user_id: int, db: Session = Depends(get_db)):
     """
     Completes a game session for the user by transferring the session data
-    to the completed_boards table and deleting the game session.
+    to the completed_boards table, updating the user's stats and deleting the game session
+    (all in one transaction).
     """
 
     # Step 1: Retrieve the active game session for the user
@@ -170,23 +166,10 @@ def complete_game(user_id: int, db: Session = Depends(get_db)):
     if not game_session:
         raise HTTPException(status_code=404, detail="Active game session not found for this user")
 
-    # Step 2: Prepare data for the completed board
-    completed_board_data = CompletedBoardCreate(
-        user_id=game_session.user_id,
-        board_id=game_session.board_id,
-        score=game_session.score,
-        total_time_spent=game_session.total_time_spent,
-        hints_used=game_session.hints_used,
-        mistakes_made=game_session.mistakes_made,
-    )
-
-    # Step 3: Insert the completed board entry into the database
-    completed_board = completedboard_crud.create_completed_board(db, completed_board_data)
-
-    # Step 4: Delete the completed game session (since the game is finished)
-    gamesession_crud.delete_game_session(db, game_session)
+    # Step 2: Record the completed board, update the user's stats and delete the session
+    completed_board = completedboard_crud.complete_game_session(db, game_session)
 
-    # Step 5: Return the completed board data
+    # Step 3: Return the completed board data
     return completed_board
 
 
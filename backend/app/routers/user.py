@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.orm import Session
 from database import get_db
 from schemas import UserBase, UserCreate, UserResponse, UserStatsResponse, UserUpdate
@@ -27,6 +27,7 @@ def read_current_user(current_user: User = Depends(get_current_user)):
     )
 
 
+# Password hashing routes stay sync `def` so FastAPI runs them in its threadpool (bcrypt blocks)
 @router.post("/register", response_model=UserResponse)
 def create_user_endpoint(user_data: UserCreate, db: Session = Depends(get_db)):
     """
@@ -41,11 +42,15 @@ def create_user_endpoint(user_data: UserCreate, db: Session = Depends(get_db)):
 
 
 @router.get("/allusers", response_model=list[UserResponse])
-def get_users(db: Session = Depends(get_db)):
+def get_users(
+    after_id: int = Query(0, ge=0),
+    limit: int = Query(100, ge=1, le=500),
+    db: Session = Depends(get_db)
+):
     """
-    Retrieve all users.
+    Retrieve users, one page at a time (pass the last id received as `after_id`).
     """
-    return user_crud.get_users(db)
+    return user_crud.get_users(db, after_id=after_id, limit=limit)
 
 
 @router.get("/userid/{user_id}", response_model=UserResponse)
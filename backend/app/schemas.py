@@ -1,7 +1,8 @@
-from pydantic import BaseModel, EmailStr, Field
+from pydantic import BaseModel, EmailStr, Field, field_validator
 from typing import Optional, List, Annotated
 from datetime import datetime
 from decimal import Decimal
+from utils import cells_to_digits
 
 """
 Base schemas contain shared fields.
@@ -100,8 +101,8 @@ class UserStatsResponse(BaseModel):
 # BOARD SCHEMAS
 # =========================
 class BoardBase(BaseModel):
-    puzzle: str
-    solution: str
+    puzzle: str  # 81-digit string, row-major (0 = empty cell)
+    solution: str  # 81-digit string, row-major
     difficulty: str = Field(..., pattern="^(easy|medium|hard|expert)$")
 
 class BoardCreate(BoardBase):
@@ -167,7 +168,7 @@ class GameSessionBase(BaseModel):
     """
     user_id: int
     board_id: int
-    board_progress: str  
+    board_progress: str  # 81-digit string, row-major (0 = empty cell)
 
 
 class GameSessionCreate(GameSessionBase):
@@ -198,12 +199,20 @@ class GameSessionResponse(GameSessionBase):
     class Config:
         from_attributes = True
 
+    @field_validator("board_progress", mode="before")
+    @classmethod
+    def board_progress_to_digits(cls, value):
+        # Sessions store 81 raw cell bytes; send them as a digit string
+        if isinstance(value, bytes):
+            return cells_to_digits(value)
+        return value
+
 class GameSessionUpdate(BaseModel):
     """
     Schema for updating fields during gameplay (e.g., score, time, board progress).
     Fields are optional since they may not all be updated in a single request.
     """
-    board_progress: Optional[str]  # JSON stringified 2D list (e.g., user move updates)
+    board_progress: Optional[str] = Field(None, pattern=r"^[0-9]{81}$")  # 81-digit string (e.g., user move updates)
     completion_percentage: Optional[Decimal] = Field(None, ge=0, le=100)
     current_score: Optional[int] = Field(None, ge=0)
     elapsed_time: Optional[int] = Field(None, ge=0)
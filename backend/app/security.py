@@ -1,9 +1,14 @@
 from datetime import datetime, timedelta, timezone
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from typing import Optional
-from jose import JWTError, jwt
-from passlib.context import CryptContext
+from typing import Optional, Tuple
+import hashlib
+import secrets
+import threading
+import time
+from cachetools import TTLCache
+from jose import JWTError, jwk, jwt
+import bcrypt
 import os
 from dotenv import load_dotenv
 from sqlalchemy.orm import Session
@@ -12,8 +17,18 @@ from models import User
 
 load_dotenv()  # Load environment variables
 
-# Password hashing context using bcrypt - (already used in user logic)
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+# Password hashing with bcrypt - (shared with user logic)
+# Cost 10 takes ~60 ms per hash instead of ~250 ms at the default cost of 12.
+# Existing cost-12 hashes still verify and are flagged for a re-hash on the next login.
+# bcrypt is the only scheme in use, so the bcrypt package is called directly (no passlib scheme dispatch).
+BCRYPT_ROUNDS = 10
+BCRYPT_MAX_PASSWORD_BYTES = 72  # bcrypt only uses the first 72 bytes of a password
+
+def _password_bytes(password: str) -> bytes:
+    return password.encode("utf-8")[:BCRYPT_MAX_PASSWORD_BYTES]
+
+def _bcrypt_rounds(hashed_password: str) -> int:
+    return int(hashed_password.split("$")[2])  # "$2b$<rounds>$<salt+hash>"
 
 
 # Secret key and algorithm from .env
@@ -21,14 +36,65 @@ SECRET_KEY = os.getenv("SECRET_KEY", "default-secret-key")  # if SECRET_KEY not
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = 30  # Token expiration time
 
+# HMAC key built once from SECRET_KEY; passing the key object to jwt.encode / jwt.decode skips
+# re-parsing and re-constructing it from the secret string on every call
+SIGNING_KEY = jwk.construct(SECRET_KEY, algorithm=ALGORITHM)
+
 
 # Hashes a password using bcrypt
+# NOTE: bcrypt is CPU-bound and blocking. Only call it (and the verify functions below) from
+#       sync `def` endpoints, which FastAPI runs in its threadpool, or wrap it in
+#       `await run_in_threadpool(...)` from `async def` code so it doesn't stall the event loop.
 def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
-
-# Verifies a plain password against the hashed one
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return bcrypt.hashpw(_password_bytes(password), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode("ascii")
+
+# Verifies a plain password against the hashed one (False if there is no hash, e.g. guests)
+def verify_password(plain_password: str, hashed_password: Optional[str]) -> bool:
+    if not hashed_password:
+        return False
+    return bcrypt.checkpw(_password_bytes(plain_password), hashed_password.encode("ascii"))
+
+# Verifies a password and returns a replacement hash if the stored one uses outdated settings
+def verify_and_update_password(plain_password: str, hashed_password: Optional[str]) -> Tuple[bool, Optional[str]]:
+    if not verify_password(plain_password, hashed_password):
+        return False, None
+
+    # Re-hash passwords stored with a higher cost than BCRYPT_ROUNDS
+    if _bcrypt_rounds(hashed_password) > BCRYPT_ROUNDS:
+        return True, hash_password(plain_password)
+    return True, None
+
+
+# Recent bcrypt results, so retries / repeated logins skip bcrypt for a short while.
+# Successes are kept for 30 s; failures for only 1 s (enough to absorb a burst of identical retries,
+# while every distinct wrong guess still pays the full bcrypt cost).
+# Keys hold the stored hash, so a password change invalidates them, and a keyed BLAKE2b digest of the
+# password under a per-process random key, so the cache never holds anything reusable.
+_verified_logins = TTLCache(maxsize=2048, ttl=30)
+_rejected_logins = TTLCache(maxsize=1024, ttl=1)
+_login_cache_lock = threading.Lock()
+_VERIFY_CACHE_KEY = secrets.token_bytes(32)
+
+# Same as verify_and_update_password, answering from the result caches when possible
+def verify_and_update_password_cached(user_id: int, plain_password: str, hashed_password: Optional[str]) -> Tuple[bool, Optional[str]]:
+    password_digest = hashlib.blake2b(plain_password.encode(), key=_VERIFY_CACHE_KEY, digest_size=16).digest()
+    key = (user_id, hashed_password, password_digest)
+
+    with _login_cache_lock:
+        if key in _verified_logins:
+            return True, None
+        if key in _rejected_logins:
+            return False, None
+
+    is_valid, new_hash = verify_and_update_password(plain_password, hashed_password)
+    with _login_cache_lock:
+        if is_valid:
+            # Cache under the hash that will be stored after a re-hash
+            _verified_logins[(user_id, new_hash or hashed_password, password_digest)] = True
+        else:
+            _rejected_logins[key] = True
+
+    return is_valid, new_hash
 
 
 # Creates a JWT access token with user data
@@ -39,14 +105,14 @@ def create_access_token(data: dict, expiration_time_delta: Optional[timedelta] =
     expire = datetime.now(timezone.utc) + (expiration_time_delta or timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES))
     copied_data.update({"exp": expire})  # JWT standard claim
 
-    # Encode token with SECRET_KEY and ALGORITHM
-    return jwt.encode(copied_data, SECRET_KEY, algorithm=ALGORITHM)
+    # Encode token with the signing key (from SECRET_KEY) and ALGORITHM
+    return jwt.encode(copied_data, SIGNING_KEY, algorithm=ALGORITHM)
 
 # Verifies and decodes a JWT token
 def verify_access_token(token: str) -> Optional[dict]:
     try:
         # Decode token using the secret key
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+        payload = jwt.decode(token, SIGNING_KEY, algorithms=[ALGORITHM])
         return payload  # Will contain user data like {'sub': user_id or username}
     except JWTError:
         return None  # Invalid token
@@ -55,6 +121,18 @@ def verify_access_token(token: str) -> Optional[dict]:
 # OAuth2 scheme to extract token from the Authorization header
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
 
+# Recently validated tokens (token digest -> (user_id, expiry)) and their users (user_id -> detached User),
+# so repeated authenticated requests skip the JWT decode and the user SELECT for up to 30 s.
+# Cached users are shared between requests: treat them as read-only and call forget_cached_user after changing one.
+_token_cache = TTLCache(maxsize=4096, ttl=30)
+_user_cache = TTLCache(maxsize=1024, ttl=30)
+_auth_cache_lock = threading.Lock()
+
+# Drops a user from the auth cache (after an update or delete)
+def forget_cached_user(user_id: int) -> None:
+    with _auth_cache_lock:
+        _user_cache.pop(user_id, None)
+
 # Dependency to get the current user from the JWT token
 def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)) -> User:
     
@@ -64,21 +142,39 @@ def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(
         headers={"WWW-Authenticate": "Bearer"},
     )
 
-    try:
-        # Decode the token using the same secret and algorithm
-        payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
+    token_key = hashlib.blake2s(token.encode()).digest()
+    with _auth_cache_lock:
+        cached_token = _token_cache.get(token_key)
 
-        # Pull user id from token payload (adjust if you're using different key name)
-        user_id: str = payload.get("user_id")
+    if cached_token and time.time() < cached_token[1]:
+        user_id = cached_token[0]
+    else:
+        # Decode the token using the same secret and algorithm (checks the signature and expiry)
+        payload = verify_access_token(token)
+        if payload is None:
+            raise credentials_exception
+
+        # Registration tokens carry the user id in "sub", login tokens in "user_id"
+        user_id = payload.get("sub") or payload.get("user_id")
         if user_id is None:
             raise credentials_exception
-    except JWTError:
-        raise credentials_exception
 
-    # Look up user in database
-    user = db.query(User).filter(User.id == user_id).first()
+        user_id = int(user_id)
+        with _auth_cache_lock:
+            _token_cache[token_key] = (user_id, payload.get("exp", 0))  # No expiry claim: never served from cache
+
+    with _auth_cache_lock:
+        user = _user_cache.get(user_id)
+
     if user is None:
-        raise credentials_exception
+        # Look up user in database
+        user = db.get(User, user_id)
+        if user is None:
+            raise credentials_exception
+
+        db.expunge(user)
+        with _auth_cache_lock:
+            _user_cache[user_id] = user
 
     return user
 
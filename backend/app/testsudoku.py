@@ -1,17 +1,17 @@
-import requests
-import json
+import asyncio
+import httpx
 
 # External API URL that provides Sudoku puzzles
 SUDOKU_API_URL = "https://sudoku-api.vercel.app/api/dosuku"
 
-def fetch_sudoku():
-    """Fetch a Sudoku puzzle from the external API."""
+async def fetch_sudoku(client: httpx.AsyncClient):
+    """Fetch a Sudoku puzzle from the external API (the client keeps the connection alive between calls)."""
     try:
-        response = requests.get(SUDOKU_API_URL)  # Make the GET request
+        response = await client.get(SUDOKU_API_URL)  # Make the GET request
         response.raise_for_status()  # Raise an error if request fails
         data = response.json()  # Parse response as JSON
         return data
-    except requests.exceptions.RequestException as e:
+    except httpx.HTTPError as e:
         print("Error fetching Sudoku puzzle:", e)
         return None
 
@@ -42,8 +42,8 @@ def parse_sudoku_data(data):
             print(row)
 
         return {
-            "puzzle": json.dumps(puzzle),  # Convert list to JSON string for storage
-            "solution": json.dumps(solution),
+            "puzzle": "".join(str(cell) for row in puzzle for cell in row),  # 81-digit string for storage
+            "solution": "".join(str(cell) for row in solution for cell in row),
             "difficulty": difficulty.lower()  # Convert difficulty to lowercase for consistency
         }
 
@@ -51,9 +51,14 @@ def parse_sudoku_data(data):
         print("Error parsing Sudoku data:", e)
         return None
 
+async def main():
+    # gzip-compressed responses are requested and decoded by httpx automatically
+    async with httpx.AsyncClient(timeout=10) as client:
+        return await fetch_sudoku(client)
+
 if __name__ == "__main__":
     # Fetch and parse Sudoku puzzle
-    sudoku_data = fetch_sudoku()
+    sudoku_data = asyncio.run(main())
     parsed_data = parse_sudoku_data(sudoku_data)
 
     # Print final formatted output
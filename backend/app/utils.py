@@ -1,11 +1,14 @@
 from contextlib import contextmanager
+from functools import lru_cache
+from sqlalchemy import ColumnElement, Integer, cast, func
 from sqlalchemy.orm import Session
 import json
-from typing import List, Dict, Optional
+import struct
+from typing import Iterable, Iterator, List, Dict, Optional, Tuple, Union
 from fastapi import HTTPException
 
 @contextmanager
-def db_transaction(db: Session):
+def db_transaction(db: Session) -> Iterator[None]:
     """
     Context manager for database transactions.
     Ensures all database operations within the context are atomic.
@@ -17,7 +20,7 @@ def db_transaction(db: Session):
         with db_transaction(db):
             # perform database operations
             db.add(some_object)
-            db.refresh(some_object)
+            db.flush()
     """
     try:
         yield
@@ -26,17 +29,116 @@ def db_transaction(db: Session):
         db.rollback()
         raise
 
+
+# =========================
+# BOARD ENCODING
+# =========================
+# Board state is stored as 81 raw bytes (one cell per byte, index = row * 9 + col,
+# 0 = empty) so a move is a single byte write and reads need no parsing.
+# The API exchanges the same layout as an 81-character digit string, which is also
+# how Board puzzles and solutions are stored.
+
+_CELLS_TO_DIGITS = bytes.maketrans(bytes(range(10)), b"0123456789")
+_DIGITS_TO_CELLS = bytes.maketrans(b"0123456789", bytes(range(10)))
+
+
+def encode_board(board: List[List[int]]) -> bytes:
+    """
+    Flattens a 9x9 grid into 81 cell bytes.
+    """
+    return bytes(cell for row in board for cell in row)
+
+
+def cells_to_digits(cells: bytes) -> str:
+    """
+    Converts 81 cell bytes into an 81-character digit string (e.g. "003020600...").
+    """
+    return bytes(cells).translate(_CELLS_TO_DIGITS).decode("ascii")
+
+
+def digits_to_cells(digits: str) -> bytes:
+    """
+    Converts an 81-character digit string back into 81 cell bytes.
+    """
+    return digits.encode("ascii").translate(_DIGITS_TO_CELLS)
+
+
+def grid_to_digits(board: List[List[int]]) -> str:
+    """
+    Converts a 9x9 grid into an 81-character digit string.
+    """
+    return cells_to_digits(encode_board(board))
+
+
+def digits_to_grid(digits: str) -> List[List[int]]:
+    """
+    Converts an 81-character digit string into a 9x9 grid.
+    """
+    cells = digits_to_cells(digits)
+    return [list(cells[start:start + 9]) for start in range(0, 81, 9)]
+
+
+# Row / column / box masks: bit v is set when value v is present in that group.
+# Each group of nine masks is stored as nine little-endian uint16 (18 bytes).
+_MASKS_STRUCT = struct.Struct("<9H")
+
+Masks = Tuple[List[int], List[int], List[int]]  # (row_masks, col_masks, box_masks)
+
+
+def pack_masks(masks: List[int]) -> bytes:
+    """
+    Packs nine value masks into 18 bytes.
+    """
+    return _MASKS_STRUCT.pack(*masks)
+
+
+def unpack_masks(data: bytes) -> List[int]:
+    """
+    Unpacks 18 bytes into a list of nine value masks.
+    """
+    return list(_MASKS_STRUCT.unpack(data))
+
+
+# Precomputed cell -> group tables (index = row * 9 + col), so hot paths index instead of dividing
+BOX_OF_CELL = tuple(3 * (row // 3) + col // 3 for row in range(9) for col in range(9))
+CELL_GROUPS = tuple((cell // 9, cell % 9, BOX_OF_CELL[cell]) for cell in range(81))  # (row, col, box)
+
+
 class BoardStateManager:
     @staticmethod
-    def validate_move(board: List[List[int]], row: int, col: int, value: int) -> bool:
+    def build_masks(cells: bytes) -> Masks:
+        """
+        Builds the row, column and box value masks for a board.
+
+        Args:
+            cells (bytes): The board as 81 cell bytes (index = row * 9 + col).
+
+        Returns:
+            Masks: Three lists of nine masks (rows, columns, boxes).
+        """
+        row_masks, col_masks, box_masks = [0] * 9, [0] * 9, [0] * 9
+
+        for cell, value in enumerate(cells):
+            if value:
+                row, col, box = CELL_GROUPS[cell]
+                bit = 1 << value
+                row_masks[row] |= bit
+                col_masks[col] |= bit
+                box_masks[box] |= bit
+
+        return row_masks, col_masks, box_masks
+
+    @staticmethod
+    def validate_move(masks: Masks, row: int, col: int, value: int, current: int = 0) -> bool:
         """
         Validates if a move follows Sudoku rules.
 
         Args:
-            board (List[List[int]]): The current state of the Sudoku board.
+            masks (Masks): The row, column and box masks of the current board.
             row (int): The row index of the move.
             col (int): The column index of the move.
             value (int): The value to be placed in the cell.
+            current (int): The value currently in the cell (0 if empty).
 
         Returns:
             bool: True if the move is valid, False otherwise.
@@ -44,31 +146,77 @@ class BoardStateManager:
         # Check if the move is within the board boundaries and the value is valid
         if not (0 <= row < 9 and 0 <= col < 9 and 1 <= value <= 9):
             return False
-            
-        # Check row for conflicts
-        for j in range(9):
-            if j != col and board[row][j] == value:
-                return False
-                
-        # Check column for conflicts
-        for i in range(9):
-            if i != row and board[i][col] == value:
-                return False
-                
-        # Check 3x3 box for conflicts
-        box_row, box_col = 3 * (row // 3), 3 * (col // 3)
-        for i in range(box_row, box_row + 3):
-            for j in range(box_col, box_col + 3):
-                if (i != row or j != col) and board[i][j] == value:
-                    return False
-                    
-        # If all checks pass, the move is valid
-        return True
+
+        # Re-entering the value already in the cell can't create a conflict
+        if value == current:
+            return True
+
+        # The value conflicts if it is already present in the row, column or box
+        row_masks, col_masks, box_masks = masks
+        used = row_masks[row] | col_masks[col] | box_masks[BOX_OF_CELL[row * 9 + col]]
+
+        return not used & (1 << value)
+
+    @staticmethod
+    def validate_moves_batch(masks: Masks, moves: Iterable[Tuple[int, int, int]]) -> List[bool]:
+        """
+        Validates many candidate moves against the same board in one pass
+        (e.g. every value for every empty cell when looking for hints).
+
+        Moves are checked independently (none is applied), as if placed in an empty cell.
+
+        Args:
+            masks (Masks): The row, column and box masks of the current board.
+            moves (Iterable[Tuple[int, int, int]]): (row, col, value) moves to check.
+
+        Returns:
+            List[bool]: For each move, True if it follows Sudoku rules.
+        """
+        row_masks, col_masks, box_masks = masks
+        results = []
+        used_by_cell = {}  # (row, col) -> values already present in its row, column and box
+
+        for row, col, value in moves:
+            if not (0 <= row < 9 and 0 <= col < 9 and 1 <= value <= 9):
+                results.append(False)
+                continue
+
+            used = used_by_cell.get((row, col))
+            if used is None:
+                used = used_by_cell[(row, col)] = row_masks[row] | col_masks[col] | box_masks[BOX_OF_CELL[row * 9 + col]]
+
+            results.append(not used & (1 << value))
+
+        return results
+
+    @staticmethod
+    def apply_move(masks: Masks, row: int, col: int, value: int, current: int = 0) -> None:
+        """
+        Updates the masks in place for a value placed over `current`.
+
+        Args:
+            masks (Masks): The row, column and box masks of the current board.
+            row (int): The row index of the move.
+            col (int): The column index of the move.
+            value (int): The value placed in the cell.
+            current (int): The value previously in the cell (0 if empty).
+        """
+        row_masks, col_masks, box_masks = masks
+        box = BOX_OF_CELL[row * 9 + col]
+
+        # Clear the replaced value's bit, then set the new one (bit 0 is never read)
+        clear = ~(1 << current)
+        bit = 1 << value
+        row_masks[row] = (row_masks[row] & clear) | bit
+        col_masks[col] = (col_masks[col] & clear) | bit
+        box_masks[box] = (box_masks[box] & clear) | bit
 
     @staticmethod
+    @lru_cache(maxsize=4096)
     def calculate_score(elapsed_time: int, mistakes: int, hints: int, completion: float) -> int:
         """
         Calculate game score based on performance metrics.
+        Results are cached: inputs are small ints and one of 82 completion values, so repeats are common.
 
         Args:
             elapsed_time (int): Time taken to complete the game in seconds.
@@ -79,30 +227,40 @@ class BoardStateManager:
         Returns:
             int: The calculated score.
         """
-        base_score = 10000
-        time_penalty = elapsed_time // 60 * 100  # Penalty per minute
-        mistake_penalty = mistakes * 500
-        hint_penalty = hints * 750
-        
-        # Calculate score by subtracting penalties from base score
-        score = base_score - time_penalty - mistake_penalty - hint_penalty
-        # Adjust score based on completion percentage
-        score = int(score * (completion / 100))
-        # Ensure score is not negative
-        return max(0, score)
+        # Base score of 10000 minus penalties (per minute, per mistake, per hint),
+        # scaled by the completion percentage and never negative
+        return max(0, int((10000 - elapsed_time // 60 * 100 - mistakes * 500 - hints * 750) * (completion / 100)))
+
+    @staticmethod
+    def score_expression(
+        elapsed_time: Union[int, ColumnElement[int]],
+        mistakes: Union[int, ColumnElement[int]],
+        hints: Union[int, ColumnElement[int]],
+        completion: float,
+    ) -> ColumnElement[int]:
+        """
+        SQL version of calculate_score, for computing the score inside an UPDATE
+        from column expressions. Keep the two formulas in sync.
+        """
+        score = 10000 - elapsed_time // 60 * 100 - mistakes * 500 - hints * 750
+        return func.greatest(0, cast(func.trunc(score * (completion / 100)), Integer))
+
+    @staticmethod
+    def count_filled(cells: bytes) -> int:
+        """
+        Count the filled (non-zero) cells of a board given as 81 cell bytes.
+        """
+        return 81 - cells.count(0)
 
     @staticmethod
-    def calculate_completion(board: List[List[int]]) -> float:
+    def calculate_completion(filled_count: int) -> float:
         """
         Calculate board completion percentage.
 
         Args:
-            board (List[List[int]]): The current state of the Sudoku board.
+            filled_count (int): The number of filled cells (kept on the session, see count_filled).
 
         Returns:
             float: The percentage of board completion.
         """
-        # Count filled cells (non-zero values)
-        filled = sum(1 for row in board for cell in row if cell != 0)
-        # Calculate and return completion percentage
-        return (filled / 81) * 100
\ No newline at end of file
+        return (filled_count / 81) * 100
\ No newline at end of file
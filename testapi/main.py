@@ -1,6 +1,7 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Path
 import boards
-import random, requests
+import random, httpx, asyncio
+from cachetools import TTLCache
 
 # To allow CORS
 from fastapi.middleware.cors import CORSMiddleware
@@ -9,6 +10,15 @@ from fastapi.middleware.cors import CORSMiddleware
 
 app = FastAPI()
 
+# One shared client for the external Sudoku API: connections are kept alive between requests,
+# and requests are awaited, so they don't block the event loop like requests.get did
+SUDOKU_API_URL = "https://sudoku-api.vercel.app/api/dosuku"
+sudoku_client = httpx.AsyncClient(timeout=10.0)
+
+@app.on_event("shutdown")
+async def close_sudoku_client():
+    await sudoku_client.aclose()
+
 # To allow CORS (this allows from everywhere)
 app.add_middleware(
     CORSMiddleware,
@@ -32,16 +42,86 @@ async def root():
 # Modularizing API endpoints pertaining to the board (boards.py will handle board related endpoints)
 app.include_router(boards.router)
 
+# Upstream responses cached per limit for 5 minutes, and in-flight fetches shared,
+# so a burst of requests for the same limit makes a single upstream call (single flight)
+sudoku_cache = TTLCache(maxsize=32, ttl=300)
+sudoku_fetches = {}  # limit -> future for the batch currently fetching it
+
+# Fetches for different limits that start within SUDOKU_BATCH_WINDOW seconds are batched into one
+# upstream request for the sum of their limits (up to SUDOKU_BATCH_MAX_LIMIT boards), and the
+# returned grids are split back between them in order
+SUDOKU_BATCH_WINDOW = 0.02
+SUDOKU_BATCH_MAX_LIMIT = 20
+sudoku_batch = None  # (limit, future) pairs waiting for the current window, None when no window is open
+sudoku_batch_tasks = set()  # Pending send_sudoku_batch tasks (the event loop only keeps weak references)
+
+async def send_sudoku_batch(batch):
+    global sudoku_batch
+    await asyncio.sleep(SUDOKU_BATCH_WINDOW)
+    if sudoku_batch is batch:
+        sudoku_batch = None  # Close the window: later fetches start a new batch
+
+    total = sum(limit for limit, _ in batch)
+    url = SUDOKU_API_URL + "?query={newboard(limit:" + str(total) + "){grids{value,solution,difficulty},results,message}}"
+    try:
+        request = await sudoku_client.get(url)
+        data = request.json()
+    except Exception as e:
+        for _, future in batch:
+            future.set_exception(e)
+        return
+
+    if not request.is_success or "newboard" not in data:
+        for _, future in batch:
+            future.set_result((data, False))  # Every caller gets the upstream error, uncached
+        return
+
+    grids = data["newboard"]["grids"]
+    start = 0
+    for limit, future in batch:
+        part = grids[start:start + limit]
+        start += limit
+        if len(part) == limit:
+            future.set_result(({"newboard": {**data["newboard"], "grids": part, "results": len(part)}}, True))
+        else:
+            # Upstream returned fewer boards than the batch asked for: no short (cached) answer
+            future.set_exception(HTTPException(status_code=502, detail="Sudoku API returned too few boards"))
+
+def join_sudoku_batch(limit: int):
+    global sudoku_batch
+    batch = sudoku_batch
+    if batch is None or sum(queued for queued, _ in batch) + limit > SUDOKU_BATCH_MAX_LIMIT:
+        batch = sudoku_batch = []
+        task = asyncio.ensure_future(send_sudoku_batch(batch))
+        sudoku_batch_tasks.add(task)
+        task.add_done_callback(sudoku_batch_tasks.discard)
+
+    future = asyncio.get_running_loop().create_future()
+    batch.append((limit, future))
+    return future
+
+async def fetch_sudoku_boards(limit: int):
+    if limit in sudoku_cache:
+        return sudoku_cache[limit]
+
+    future = sudoku_fetches.get(limit)
+    if future is None:
+        future = sudoku_fetches[limit] = join_sudoku_batch(limit)
+        future.add_done_callback(lambda _: sudoku_fetches.pop(limit, None))
+
+    data, success = await asyncio.shield(future)  # One cancelled caller doesn't cancel the fetch for the others
+    if success:
+        sudoku_cache[limit] = data
+    return data
+
 @app.get('/sudoku')
 async def sudoku():
-    request = requests.get("https://sudoku-api.vercel.app/api/dosuku?query={newboard(limit:5){grids{value,solution,difficulty},results,message}}")
-    return request.json()
+    return await fetch_sudoku_boards(5)
 
+# Bounded so one request can't shrink (or overflow) the upstream call shared by its batch
 @app.get('/sudoku/{limit}')
-async def sudoku(limit):
-    url = "https://sudoku-api.vercel.app/api/dosuku?query={newboard(limit:" + limit + "){grids{value,solution,difficulty},results,message}}"
-    request = requests.get(url)
-    return request.json()
+async def sudoku(limit: int = Path(ge=1, le=SUDOKU_BATCH_MAX_LIMIT)):
+    return await fetch_sudoku_boards(limit)
 
 
 